@@ -1,19 +1,80 @@
 #!/usr/bin/env python3
 """
 Search for skills on skills.sh
-Usage: python search-skills.py <query>
+Usage: python search-skills.py [options] <query>
+       python search-skills.py --batch [options] [<query> ...] < queries.txt
+
+Query words that start with '-' (e.g. -fastapi) are part of the query, unless
+they parse as an option (e.g. -nodejs, which reads as -n odejs): put -- before
+such a query.
+
+Results are cached on disk, already parsed, keyed by the normalised query.
+Fresh entries (younger than --ttl) are served without a request. Stale ones
+(up to --max-stale older) are served at once and refreshed in the background.
+Anything older is fetched again. --offline only ever reads the cache.
+
+--batch runs many queries at once: cache misses are fetched by --jobs worker
+threads, each keeping one connection to the site open across its requests.
+Results are merged by skill URL, with each query's latency reported.
+--base-url (or $SKILLS_SH_URL) points the script at another site, e.g. a
+local stand-in for tests and benchmarks.
+
+--scan vets the results before anything is installed: each skill's SKILL.md
+(<skill URL>/SKILL.md) and the files it links to are fetched concurrently and
+scanned in memory by security-scan.py, and skills are reported as clean,
+warning or blocked as their scans finish. This is a first filter only; an
+installed skill still gets the full two-level scan.
 """
 
+import os
 import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
 import urllib.request
 import urllib.parse
-import json
 import re
+import codecs
+import posixpath
+import tempfile
+import importlib.util
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from html.parser import HTMLParser
 
+try:
+    import sqlite3
+except ImportError:     # pragma: no cover - Python built without sqlite
+    sqlite3 = None
+
+DEFAULT_TTL = 60 * 60               # seconds a cached result is fresh
+DEFAULT_MAX_STALE = 24 * 60 * 60    # seconds past the TTL it may still be served
+CACHE_MAX_BYTES = 4 * 1024 * 1024
+REVALIDATE_BACKOFF = 60             # seconds before retrying a background refresh
+
+DEFAULT_BASE_URL = 'https://skills.sh'
+DEFAULT_TIMEOUT = 10                # seconds per request
+DEFAULT_JOBS = 4                    # concurrent requests in --batch mode
+DEFAULT_LIMIT = 10                  # results kept per query
+CHUNK_SIZE = 16 * 1024
+DRAIN_LIMIT = 64 * 1024             # unread body worth reading to keep a connection
+
+SCANNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'security_scan.py')
+MAX_SKILL_FILES = 50                # files fetched per skill besides SKILL.md
+VERDICTS = ('clean', 'warning', 'blocked', 'error')    # in ranking order
+HEADERS = {'User-Agent': 'skill-generator/1.0'}
+
 class SkillsParser(HTMLParser):
-    def __init__(self):
+    """Collects skill links from a results page, fed in pieces as it arrives.
+    `done` is set once `limit` skills are collected; the rest can be skipped."""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, limit: int = None):
         super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.limit = limit
+        self.done = False
         self.skills = []
         self.current_skill = {}
         self.in_skill = False
@@ -22,12 +83,14 @@ class SkillsParser(HTMLParser):
         self.in_stats = False
 
     def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
         attrs_dict = dict(attrs)
         if tag == 'a' and 'href' in attrs_dict:
             href = attrs_dict['href']
             if href.startswith('/skills/'):
                 self.in_skill = True
-                self.current_skill = {'url': f"https://skills.sh{href}"}
+                self.current_skill = {'url': f"{self.base_url}{href}"}
 
     def handle_data(self, data):
         data = data.strip()
@@ -43,28 +106,546 @@ class SkillsParser(HTMLParser):
         if tag == 'a' and self.in_skill:
             if 'name' in self.current_skill:
                 self.skills.append(self.current_skill)
+                self.done = self.limit is not None and len(self.skills) >= self.limit
             self.in_skill = False
             self.current_skill = {}
 
-def search_skills(query: str) -> list:
-    """Search skills.sh for matching skills."""
-    url = f"https://skills.sh/search?q={urllib.parse.quote(query)}"
+def normalize_query(query: str) -> str:
+    """Case and whitespace do not change the results, so they are folded."""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+def cache_key(query: str, base_url: str = DEFAULT_BASE_URL, limit: int = DEFAULT_LIMIT) -> str:
+    return f"{base_url.rstrip('/')} {limit} {normalize_query(query)}"
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'skill-generator', 'search-skills')
+
+class SearchCache:
+    """Size-bounded LRU cache of parsed search results in a SQLite database."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = CACHE_MAX_BYTES):
+        if sqlite3 is None:
+            raise OSError('sqlite3 module is not available')
+        self.cache_dir = cache_dir or default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        try:
+            self.db = sqlite3.connect(os.path.join(self.cache_dir, 'searches.sqlite3'), timeout=30)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS searches ('
+                ' key TEXT PRIMARY KEY, results TEXT NOT NULL, fetched REAL NOT NULL,'
+                ' size INTEGER NOT NULL, last_used REAL NOT NULL, revalidating REAL NOT NULL DEFAULT 0)'
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            raise OSError(f'cannot open search cache: {e}') from e
+
+    def get(self, key: str):
+        """Return (results, age in seconds) for a cache_key, or None."""
+        try:
+            row = self.db.execute('SELECT results, fetched FROM searches WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE searches SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+            return json.loads(row[0]), max(time.time() - row[1], 0)
+        except (sqlite3.Error, ValueError):
+            return None     # a busy or broken cache only costs a request
+
+    def put(self, key: str, results: list):
+        """Store parsed results, then evict least recently used entries until
+        the cache fits in max_bytes."""
+        data = json.dumps(results)
+        now = time.time()
+        try:
+            self.db.execute('INSERT OR REPLACE INTO searches (key, results, fetched, size, last_used) '
+                            'VALUES (?, ?, ?, ?, ?)', (key, data, now, len(data), now))
+            total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM searches').fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in self.db.execute('SELECT key, size FROM searches ORDER BY last_used').fetchall():
+                    self.db.execute('DELETE FROM searches WHERE key = ?', (key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self.db.commit()
+        except sqlite3.Error:
+            pass
+
+    def claim_revalidation(self, key: str) -> bool:
+        """True if no background refresh of `key` started in the last
+        REVALIDATE_BACKOFF seconds; records that one is starting now."""
+        now = time.time()
+        try:
+            cursor = self.db.execute('UPDATE searches SET revalidating = ? WHERE key = ? AND revalidating < ?',
+                                     (now, key, now - REVALIDATE_BACKOFF))
+            self.db.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self.db.close()
+
+def open_cache(cache_dir: str = None):
+    """Open the search cache, or return None (with a warning) if unusable."""
+    try:
+        return SearchCache(cache_dir)
+    except OSError as e:
+        print(f"Warning: search cache disabled: {e}", file=sys.stderr)
+        return None
+
+class SkillsClient:
+    """GETs from one site over persistent HTTP/1.1 connections, one per
+    thread, so a batch pays for each connection and TLS handshake once per
+    worker rather than once per query. When a proxy is configured for the
+    site it falls back to urllib, which honours the proxy settings."""
+
+    MAX_REDIRECTS = 3
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, timeout: float = DEFAULT_TIMEOUT):
+        parts = urllib.parse.urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError(f"invalid base URL: {base_url}")
+        self.base_url = base_url.rstrip('/')
+        self.scheme, self.netloc, self.prefix = parts.scheme, parts.netloc, parts.path.rstrip('/')
+        self.timeout = timeout
+        proxy = urllib.request.getproxies().get(parts.scheme)
+        self.use_urllib = bool(proxy) and not urllib.request.proxy_bypass(parts.hostname or '')
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []   # every connection opened, for close()
+
+    def get(self, path: str) -> bytes:
+        """Return the body of base URL + `path`; raises OSError on failure."""
+        chunks = []
+        self.stream(path, chunks.append)
+        return b''.join(chunks)
+
+    def stream(self, path: str, consume):
+        """Pass the body of base URL + `path` to `consume` in chunks as they
+        arrive, until it returns True or the body ends; raises OSError on
+        failure."""
+        if self.use_urllib:
+            req = urllib.request.Request(self.base_url + path, headers=HEADERS)
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                while (chunk := response.read1(CHUNK_SIZE)) and not consume(chunk):
+                    pass
+            return
+        target = self.prefix + path
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, location = self._request(target, consume)
+            if status not in (301, 302, 303, 307, 308):
+                if status != 200:
+                    raise OSError(f"HTTP Error {status} for {self.scheme}://{self.netloc}{target}")
+                return
+            url = urllib.parse.urlsplit(urllib.parse.urljoin(f"{self.scheme}://{self.netloc}{target}", location or ''))
+            if (url.scheme, url.netloc) != (self.scheme, self.netloc):
+                raise OSError(f"redirected to another site: {url.geturl()}")
+            target = url.path + (f"?{url.query}" if url.query else '')
+        raise OSError("too many redirects")
+
+    def _request(self, target: str, consume) -> tuple:
+        conn = getattr(self.local, 'conn', None)
+        while True:
+            reused = conn is not None
+            if conn is None:
+                cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+                conn = self.local.conn = cls(self.netloc, timeout=self.timeout)
+                with self.lock:
+                    self.connections.append(conn)
+            try:
+                conn.request('GET', target, headers=HEADERS)
+                response = conn.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                conn = self.local.conn = None
+                # The server may close a kept-alive connection while it is idle
+                if reused and isinstance(e, (ConnectionError, http.client.RemoteDisconnected)):
+                    continue
+                raise OSError(str(e) or type(e).__name__) from e
+            reusable = True
+            try:
+                if response.status == 200:
+                    reusable = self._read(response, consume)
+                else:
+                    response.read()
+            except (http.client.HTTPException, OSError) as e:
+                reusable = False
+                raise OSError(str(e) or type(e).__name__) from e
+            finally:
+                if not reusable or response.will_close:
+                    conn.close()
+                    self.local.conn = None
+            return response.status, response.getheader('Location')
+
+    @staticmethod
+    def _read(response, consume) -> bool:
+        """Feed `response` to `consume` until it has had enough. A short
+        remainder is read and dropped, so the connection stays usable;
+        returns False if it was left unread."""
+        while chunk := response.read1(CHUNK_SIZE):
+            if consume(chunk):
+                if response.length is None or response.length > DRAIN_LIMIT:
+                    return False
+                break
+        response.read()     # also marks the response complete, which read1() does not
+        return True
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+
+def fetch_skills(query: str, client: SkillsClient = None, limit: int = DEFAULT_LIMIT) -> list:
+    """Fetch the first `limit` search results, from skills.sh unless `client`
+    is for another site; raises OSError on network errors.
+
+    The page is parsed as it is received, and the download stops as soon as
+    `limit` skills have been seen."""
+    own_client = client is None
+    client = client or SkillsClient()
+    parser = SkillsParser(client.base_url, limit)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def consume(chunk: bytes) -> bool:
+        parser.feed(decoder.decode(chunk))
+        return parser.done
 
     try:
-        req = urllib.request.Request(
-            url,
-            headers={'User-Agent': 'skill-generator/1.0'}
+        client.stream(f"/search?q={urllib.parse.quote(query)}", consume)
+    finally:
+        if own_client:
+            client.close()
+    if not parser.done:
+        parser.feed(decoder.decode(b'', final=True))
+    return parser.skills[:limit]
+
+def _revalidate_in_background(query: str, key: str, cache: SearchCache, client: SkillsClient, limit: int):
+    """Refresh a stale entry from a detached process, so the caller is not
+    kept waiting for the request (or kept alive until it finishes)."""
+    if not cache.claim_revalidation(key):
+        return
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--refresh', '--cache-dir', cache.cache_dir,
+             '--base-url', client.base_url, '--timeout', str(client.timeout), '--limit', str(limit),
+             '--', query],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
         )
-        with urllib.request.urlopen(req, timeout=10) as response:
-            html = response.read().decode('utf-8')
+    except OSError:
+        pass    # the next search past the TTL tries again
+
+def search_many(queries: list, cache: SearchCache = None, ttl: float = DEFAULT_TTL,
+                max_stale: float = DEFAULT_MAX_STALE, offline: bool = False,
+                client: SkillsClient = None, jobs: int = DEFAULT_JOBS, limit: int = DEFAULT_LIMIT) -> list:
+    """Search for every query, fetching cache misses (up to `limit` results
+    each) with up to `jobs` concurrent requests through `client` (default:
+    skills.sh).
+
+    Returns one dict per distinct query, in order: 'query', 'results',
+    'seconds' (time to answer it) and 'source', which is
+      cache    - cached and younger than `ttl` (any age with `offline`)
+      stale    - cached up to `max_stale` past the TTL; refreshed in the background
+      network  - fetched (and cached)
+      fallback - the fetch failed ('error' says why); older cached results
+      error    - the fetch failed and nothing was cached
+      offline  - not cached, and `offline` forbids a request"""
+    own_client = client is None
+    client = client or SkillsClient()
+    outcomes = {}       # cache key -> outcome, for distinct queries in order
+    pending = []        # (outcome, cache key, cached entry) to fetch
+    for query in queries:
+        key = cache_key(query, client.base_url, limit)
+        if key in outcomes:
+            continue
+        started = time.perf_counter()
+        cached = cache.get(key) if cache else None
+        outcome = outcomes[key] = {'query': query, 'results': [], 'source': None}
+        if cached is not None and (offline or cached[1] < ttl):
+            outcome.update(results=cached[0], source='cache')
+        elif cached is not None and cached[1] < ttl + max_stale:
+            _revalidate_in_background(query, key, cache, client, limit)
+            outcome.update(results=cached[0], source='stale')
+        elif offline:
+            outcome['source'] = 'offline'
+        else:
+            pending.append((outcome, key, cached))
+        outcome['seconds'] = time.perf_counter() - started
+
+    def fetch(query: str) -> tuple:
+        started = time.perf_counter()
+        try:
+            return fetch_skills(query, client, limit), None, time.perf_counter() - started
+        except Exception as e:
+            return None, e, time.perf_counter() - started
+
+    try:
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(pending)))) as pool:
+                fetched = pool.map(fetch, [outcome['query'] for outcome, _key, _cached in pending])
+                for (outcome, key, cached), (results, error, seconds) in zip(pending, fetched):
+                    outcome['seconds'] += seconds
+                    if error is None:
+                        outcome.update(results=results, source='network')
+                        if cache:
+                            cache.put(key, results)
+                    else:
+                        outcome['error'] = str(error)
+                        if cached is not None:
+                            outcome.update(results=cached[0], source='fallback')
+                        else:
+                            outcome['source'] = 'error'
+    finally:
+        if own_client:
+            client.close()
+    return list(outcomes.values())
+
+def merge_results(outcomes: list) -> list:
+    """Merge search_many results into one list of distinct skills (by URL).
+    Each skill lists the queries that found it under 'queries'; skills found
+    by more queries come first, then those ranked higher by any query."""
+    merged = {}
+    best_rank = {}
+    for outcome in outcomes:
+        for rank, skill in enumerate(outcome['results']):
+            url = skill.get('url')
+            if url not in merged:
+                merged[url] = dict(skill, queries=[])
+                best_rank[url] = rank
+            merged[url]['queries'].append(outcome['query'])
+            best_rank[url] = min(best_rank[url], rank)
+    return sorted(merged.values(), key=lambda skill: (-len(skill['queries']), best_rank[skill.get('url')]))
 
-        parser = SkillsParser()
-        parser.feed(html)
-        return parser.skills[:10]  # Return top 10
+def search_skills(query: str, cache: SearchCache = None, ttl: float = DEFAULT_TTL,
+                  max_stale: float = DEFAULT_MAX_STALE, offline: bool = False,
+                  client: SkillsClient = None, limit: int = DEFAULT_LIMIT) -> list:
+    """Search skills.sh (or `client`'s site) for up to `limit` matching skills.
 
-    except Exception as e:
-        print(f"Error searching: {e}", file=sys.stderr)
-        return []
+    With a cache, entries younger than `ttl` are returned as they are, and
+    entries up to `max_stale` seconds past it are returned and refreshed in
+    the background. Older entries are fetched again, or returned if the fetch
+    fails. With `offline`, only the cache is consulted, at any age."""
+    outcome = search_many([query], cache, ttl, max_stale, offline, client, limit=limit)[0]
+    if 'error' in outcome:
+        print(f"Error searching: {outcome['error']}", file=sys.stderr)
+        if outcome['source'] == 'fallback':
+            print("Showing cached results from an earlier search.", file=sys.stderr)
+    return outcome['results']
+
+def load_scanner():
+    spec = importlib.util.spec_from_file_location('security_scan', SCANNER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# Directories a skill keeps its own files in (see the Agent Skills spec)
+SKILL_DIRS = ('scripts/', 'references/', 'assets/', 'templates/')
+
+# Fenced code blocks hold examples, not references to the skill's files
+_FENCED_BLOCK_RE = re.compile(r'^ {0,3}(`{3,}|~{3,}).*?(?:^ {0,3}\1|\Z)', re.MULTILINE | re.DOTALL)
+# Relative targets of markdown links, and inline-code paths such as `scripts/run.py`
+_LINKED_FILE_RE = re.compile(r'\]\(<?([^)\s>]+)>?\)|`([\w.-]+(?:/[\w.-]+)+)`')
+
+def linked_files(skill_md: str, extensions: tuple) -> list:
+    """(path, linked) for the skill's own files that SKILL.md links to, or
+    names in inline code under one of SKILL_DIRS (`linked` is False), up to
+    MAX_SKILL_FILES. URLs, paths outside the skill and code blocks are
+    skipped."""
+    files = {}
+    for link, code in _LINKED_FILE_RE.findall(_FENCED_BLOCK_RE.sub('', skill_md)):
+        path = (link or code).split('#')[0].split('?')[0]
+        if ':' in path or path.startswith('/') or not path.endswith(extensions):
+            continue
+        path = posixpath.normpath(urllib.parse.unquote(path))
+        stem = posixpath.basename(path).rpartition('.')[0]
+        if not stem or path.startswith('..') or path == 'SKILL.md' or (code and not path.startswith(SKILL_DIRS)):
+            continue
+        files[path] = files.get(path, False) or bool(link)
+        if len(files) == MAX_SKILL_FILES:
+            break
+    return list(files.items())
+
+def vet_skills(skills: list, client: SkillsClient, scanner, jobs: int = DEFAULT_JOBS):
+    """Fetch each skill's SKILL.md and then the files it links to, and scan
+    them with the security scanner, in `jobs` threads. Files are scanned in
+    memory up to the scanner's STREAM_THRESHOLD; larger ones are spooled to
+    a temporary file and scanned in windows, and only that much of a larger
+    SKILL.md is searched for links.
+
+    Yields each skill as soon as its verdict is in, with 'verdict' (one of
+    VERDICTS), 'critical', 'warnings', 'files' (scanned) and 'findings'
+    ((file, Finding) pairs). A skill is blocked at its first CRITICAL
+    finding, and its remaining files are not fetched. 'error' means SKILL.md
+    could not be fetched; files it links to that could not be are listed
+    under 'missing' and make the skill a warning at best (files only named
+    in inline code do not)."""
+
+    def fetch_and_scan(skill_path: str, path: str) -> tuple:
+        # A file above STREAM_THRESHOLD spills to disk and is scanned in
+        # windows, so a worker holds at most that much of a download
+        with tempfile.SpooledTemporaryFile(max_size=scanner.STREAM_THRESHOLD) as body:
+
+            def consume(chunk: bytes) -> bool:
+                body.write(chunk)
+                return body.tell() > scanner.MAX_FILE_SIZE
+
+            client.stream(f"{skill_path}/{urllib.parse.quote(path)}", consume)
+            size = body.tell()
+            body.seek(0)
+            if size <= scanner.STREAM_THRESHOLD:
+                data = body.read()
+                return data, scanner.scan_blob(path, data, max_file_size=scanner.MAX_FILE_SIZE, fail_fast=True)
+            # Over the limit, scan_blob reports the file without reading it
+            result = scanner.scan_blob(path, body, size, max_file_size=scanner.MAX_FILE_SIZE, fail_fast=True)
+            body.seek(0)
+            return body.read(scanner.STREAM_THRESHOLD), result
+
+    def verdict(state: dict) -> dict:
+        skill = state['skill']
+        results = state['results']
+        critical = sum(result['critical_count'] for result in results)
+        warnings = sum(result['warning_count'] for result in results)
+        if state['error']:
+            label = 'error'
+        else:
+            label = 'blocked' if critical else 'warning' if warnings or state['missing'] else 'clean'
+        vetted = dict(skill, verdict=label, critical=critical, warnings=warnings, files=len(results),
+                      findings=[(result['file'], finding) for result in results for finding in result['findings']])
+        if state['error']:
+            vetted['error'] = state['error']
+        if state['missing']:
+            vetted['missing'] = state['missing']
+        return vetted
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {}    # future -> (state, path, linked)
+        for skill in skills:
+            state = {'skill': skill, 'pending': 0, 'results': [], 'missing': [], 'error': None}
+            url = skill.get('url', '')
+            if not url.startswith(client.base_url + '/'):
+                state['error'] = f"not on {client.base_url}: {url}"
+                yield verdict(state)
+                continue
+            state['path'] = url[len(client.base_url):].rstrip('/')
+            futures[pool.submit(fetch_and_scan, state['path'], 'SKILL.md')] = (state, 'SKILL.md', True)
+            state['pending'] = 1
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                state, path, linked = futures.pop(future)
+                state['pending'] -= 1
+                try:
+                    data, result = future.result()
+                except OSError as e:
+                    if path == 'SKILL.md':
+                        state['error'] = str(e)
+                    elif linked:
+                        state['missing'].append(path)
+                else:
+                    state['results'].append(result)
+                    if result['critical_count']:
+                        for other, (other_state, _path, _linked) in list(futures.items()):
+                            if other_state is state and other.cancel():
+                                del futures[other]
+                                state['pending'] -= 1
+                    elif path == 'SKILL.md':
+                        text = data.decode('utf-8', errors='ignore')
+                        for file, linked in linked_files(text, scanner.SCANNED_EXTENSIONS):
+                            futures[pool.submit(fetch_and_scan, state['path'], file)] = (state, file, linked)
+                            state['pending'] += 1
+                if state['pending'] == 0:
+                    yield verdict(state)
+
+def rank_skills(vetted: list, skills: list) -> list:
+    """Order vetted skills clean first, then warning, blocked and error,
+    keeping their order in `skills` (the search ranking) within each group."""
+    position = {skill.get('url'): i for i, skill in enumerate(skills)}
+    return sorted(vetted, key=lambda skill: (VERDICTS.index(skill['verdict']), position.get(skill.get('url'), 0)))
+
+def print_verdict(skill: dict):
+    detail = skill.get('error') or (f"{skill['critical']} critical, {skill['warnings']} warnings "
+                                    f"in {skill['files']} files")
+    if skill.get('missing'):
+        detail += f", {len(skill['missing'])} linked files unavailable"
+    print(f"  {skill['verdict'].upper():<8} {skill.get('name', 'Unknown')}  ({detail})")
+
+def print_outcomes(outcomes: list):
+    width = min(max(len(o['query']) for o in outcomes), 40)
+    for o in outcomes:
+        note = f"  ({o['error']})" if 'error' in o else ''
+        print(f"  {o['query'][:width]:<{width}}  {len(o['results']):>3} results  {o['source']:<8} "
+              f"{o['seconds'] * 1000:7.1f} ms{note}")
+    print()
+
+def print_skills(skills: list):
+    for i, skill in enumerate(skills, 1):
+        found_by = f"  [{len(skill['queries'])} queries]" if len(skill.get('queries', ())) > 1 else ''
+        verdict = f"  [{skill['verdict'].upper()}]" if 'verdict' in skill else ''
+        print(f"{i}. {skill.get('name', 'Unknown')}{found_by}{verdict}")
+        if 'description' in skill:
+            print(f"   {skill['description'][:100]}...")
+        print(f"   URL: {skill.get('url', 'N/A')}")
+        for file, finding in skill.get('findings', ())[:3]:
+            print(f"   {finding.severity} {file}:{finding.line}: {finding.description}")
+        print()
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='search-skills.py',
+        description='Search for skills on skills.sh.',
+        epilog="Example: python search-skills.py 'react best practices'",
+    )
+    parser.add_argument('query', nargs='*',
+                        help='search terms; with --batch, each argument is a separate query')
+    parser.add_argument('--batch', action='store_true',
+                        help='run several queries concurrently and merge their results; queries come from '
+                             'the arguments, and from stdin (one per line) when there are none or one is "-"')
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS, metavar='N',
+                        help=f'concurrent requests in --batch mode (default: {DEFAULT_JOBS})')
+    parser.add_argument('-n', '--limit', type=int, default=DEFAULT_LIMIT, metavar='N',
+                        help=f'results per query; the download stops once they are in (default: {DEFAULT_LIMIT})')
+    parser.add_argument('--scan', action='store_true',
+                        help="fetch each result's SKILL.md and the files it links to, scan them in memory "
+                             'with security-scan.py, and rank the results clean / warning / blocked')
+    parser.add_argument('--json', action='store_true',
+                        help='print the queries (source, latency) and merged skills as JSON')
+    parser.add_argument('--base-url', metavar='URL', default=os.environ.get('SKILLS_SH_URL', DEFAULT_BASE_URL),
+                        help=f'site to search (default: $SKILLS_SH_URL or {DEFAULT_BASE_URL})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SECONDS',
+                        help=f'per-request timeout (default: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, metavar='SECONDS',
+                        help=f'serve cached results younger than this without a request (default: {DEFAULT_TTL})')
+    parser.add_argument('--max-stale', type=float, default=DEFAULT_MAX_STALE, metavar='SECONDS',
+                        help='serve results up to this much past the TTL while refreshing them in the '
+                             f'background (default: {DEFAULT_MAX_STALE})')
+    parser.add_argument('--offline', action='store_true', help='only serve cached results, never make a request')
+    parser.add_argument('--no-cache', action='store_true', help='always make a request, and do not store results')
+    parser.add_argument('--cache-dir', metavar='DIR', default=None,
+                        help=f'search cache location (default: {default_cache_dir()})')
+    # Internal: the detached background refresh started by _revalidate_in_background
+    parser.add_argument('--refresh', action='store_true', help=argparse.SUPPRESS)
+    return parser
+
+def parse_args(parser: argparse.ArgumentParser, argv: list) -> argparse.Namespace:
+    """Parse `argv`, keeping words that merely look like options (-fastapi)
+    in the query, in command line order: the query used to be the whole
+    command line. Unknown --options are still an error."""
+    args, extra = parser.parse_known_args(argv)
+    unknown = [arg for arg in extra if arg.startswith('--')]
+    if unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    if extra:
+        words = args.query + extra
+        args.query = []
+        for arg in argv:
+            if arg in words:
+                words.remove(arg)
+                args.query.append(arg)
+    return args
 
 def main():
     if len(sys.argv) < 2:
@@ -72,27 +653,113 @@ def main():
         print("Example: python search-skills.py 'react best practices'")
         sys.exit(1)
 
-    query = ' '.join(sys.argv[1:])
-    print(f"Searching skills.sh for: {query}\n")
+    args = parse_args(build_arg_parser(), sys.argv[1:])
+    if args.offline and args.no_cache:
+        print("Error: --offline needs the cache, it cannot be combined with --no-cache", file=sys.stderr)
+        sys.exit(1)
+    if args.jobs < 1 or args.limit < 1 or args.timeout <= 0:
+        print("Error: --jobs, --limit and --timeout must be positive", file=sys.stderr)
+        sys.exit(1)
+    if args.batch:
+        queries = [query for query in args.query if query != '-']
+        if not args.query or '-' in args.query:
+            queries += [line.strip() for line in sys.stdin if line.strip()]
+    else:
+        queries = [' '.join(args.query)] if args.query else []
+    if not queries:
+        print("Usage: python search-skills.py <query>")
+        print("Example: python search-skills.py 'react best practices'")
+        sys.exit(1)
+    try:
+        client = SkillsClient(args.base_url, args.timeout)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    scanner = None
+    if args.scan and not args.refresh:
+        try:
+            scanner = load_scanner()
+        except (OSError, ImportError, SyntaxError) as e:
+            print(f"Error: cannot load {SCANNER_PATH}: {e}", file=sys.stderr)
+            sys.exit(1)
+    cache = None if args.no_cache else open_cache(args.cache_dir)
+
+    if args.refresh:
+        if cache:
+            try:
+                cache.put(cache_key(queries[0], client.base_url, args.limit),
+                          fetch_skills(queries[0], client, args.limit))
+            except Exception:
+                pass
+            cache.close()
+        sys.exit(0)
+
+    site = client.netloc
+    if not args.json:
+        if args.batch:
+            print(f"Searching {site} for {len(queries)} queries ({args.jobs} workers)\n")
+        else:
+            print(f"Searching {site} for: {queries[0]}\n")
 
-    skills = search_skills(query)
+    try:
+        if args.batch or args.json:
+            outcomes = search_many(queries, cache, args.ttl, args.max_stale, args.offline, client,
+                                   args.jobs, args.limit)
+            skills = merge_results(outcomes)
+            if args.batch and not args.json:
+                print_outcomes(outcomes)
+        else:
+            skills = search_skills(queries[0], cache, args.ttl, args.max_stale, args.offline, client,
+                                   args.limit)
+        if scanner and skills:
+            if not args.json:
+                print(f"Scanning {len(skills)} skills:\n")
+            vetted = []
+            for skill in vet_skills(skills, client, scanner, args.jobs):
+                vetted.append(skill)
+                if not args.json:
+                    print_verdict(skill)
+            skills = rank_skills(vetted, skills)
+            if not args.json:
+                print()
+    finally:
+        client.close()
+        if cache:
+            cache.close()
+
+    if args.json:
+        for skill in skills:
+            if 'findings' in skill:
+                skill['findings'] = [{'file': file, **finding._asdict()} for file, finding in skill['findings']]
+        print(json.dumps({
+            'queries': [{'query': o['query'], 'source': o['source'], 'seconds': round(o['seconds'], 4),
+                         'results': len(o['results']), **({'error': o['error']} if 'error' in o else {})}
+                        for o in outcomes],
+            'skills': skills,
+        }, indent=2))
+        sys.exit(0)
 
     if not skills:
+        if args.offline:
+            print("No cached results for this query (offline).")
+            sys.exit(0)
         print("No skills found. Try a different query.")
-        print("\nAlternative: Visit https://skills.sh directly")
+        print(f"\nAlternative: Visit {client.base_url} directly")
         sys.exit(0)
 
-    print(f"Found {len(skills)} skills:\n")
+    if scanner:
+        print("Ranked by scan verdict:\n")
+    elif args.batch:
+        print(f"Found {len(skills)} distinct skills:\n")
+    else:
+        print(f"Found {len(skills)} skills:\n")
 
-    for i, skill in enumerate(skills, 1):
-        print(f"{i}. {skill.get('name', 'Unknown')}")
-        if 'description' in skill:
-            print(f"   {skill['description'][:100]}...")
-        print(f"   URL: {skill.get('url', 'N/A')}")
-        print()
+    print_skills(skills)
 
     print("\nTo install a skill:")
     print("  npx skills add <owner/repo>")
+    if scanner:
+        print("Never install a BLOCKED skill, and scan the installed copy with security-scan.py as well.")
 
 if __name__ == '__main__':
     main()
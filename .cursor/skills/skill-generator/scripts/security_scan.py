@@ -0,0 +1,2788 @@
+#!/usr/bin/env python3
+"""
+Security Scanner for Agent Skills
+Detects prompt injection, data exfiltration, and malicious instructions in SKILL.md files.
+
+The scanner itself: rules, match engine, detectors, reporters, git, watch and
+server modes. Run it through security-scan.py, which imports this module so
+that its bytecode is cached (a script run directly is compiled every time).
+
+Usage: python security-scan.py [options] <path-to-skill-directory-or-SKILL.md>
+
+Exit codes:
+  0 - Clean (no threats detected)
+  1 - Threats detected (BLOCKED)
+  2 - Warnings detected (review recommended)
+  3 - Usage error
+"""
+
+import sys
+import os
+import re
+import argparse
+import json
+import time
+import signal
+import stat
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+from bisect import bisect_right
+from collections import namedtuple
+# concurrent.futures, subprocess, socket, sqlite3, hashlib, base64 and codecs
+# are imported where they are used: together they cost more startup than the
+# rest, and the most common run (one small SKILL.md) needs few of them. For the
+# same reason records are collections.namedtuple rather than typing.NamedTuple.
+
+# ─── Colors ───────────────────────────────────────────────────────────────────
+
+RED = '\033[0;31m'
+YELLOW = '\033[1;33m'
+GREEN = '\033[0;32m'
+BOLD = '\033[1m'
+NC = '\033[0m'
+
+# ─── Threat Patterns ─────────────────────────────────────────────────────────
+# RULES is plain data: each Rule is compiled only when a scan needs it (see
+# MatchEngine), so startup and single-file scans skip most of the regex
+# compilation. THREAT_PATTERNS holds every rule compiled, for callers that
+# want the regexes themselves.
+# severity: "CRITICAL" = block install, "WARNING" = flag for review
+
+RULE_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+Rule = namedtuple('Rule', 'pattern severity description flags', defaults=(RULE_FLAGS,))
+
+
+RULES = [
+    # ── 1. Instruction Override / Role Hijacking ──────────────────────────────────
+
+    Rule(r'ignore\s+(all\s+)?(previous|prior|above|earlier|preceding)\s+(instructions|rules|guidelines|prompts|constraints)',
+         'CRITICAL', 'Instruction override: attempts to discard prior instructions'),
+
+    Rule(r'disregard\s+(all\s+)?(previous|prior|above|earlier|preceding)\s+(instructions|rules|guidelines|prompts|constraints)',
+         'CRITICAL', 'Instruction override: attempts to discard prior instructions'),
+
+    Rule(r'forget\s+(everything|all|what)\s+(you|that)\s+(were|was|know|have been)',
+         'CRITICAL', 'Instruction override: memory wipe attempt'),
+
+    Rule(r'(you\s+are\s+now|from\s+now\s+on\s+you\s+are|pretend\s+(to\s+be|you\s+are)|act\s+as\s+if\s+you\s+are|roleplay\s+as)\s+(?!an?\s+(expert|professional|experienced)\s+(skill|agent|developer|engineer))',
+         'CRITICAL', 'Role hijacking: attempts to override agent identity'),
+
+    Rule(r'new\s+(system\s+)?(instructions|rules|prompt|role)\s*:',
+         'CRITICAL', 'Instruction injection: defines new system-level instructions'),
+
+    Rule(r'<\s*system\s*>|<\s*(?:/\s*)?system-?(message|prompt|instruction)\s*>',
+         'CRITICAL', 'Fake system tag: injects fake system-level XML tags'),
+
+    Rule(r'SYSTEM\s*:\s*you\s+(are|must|should|will|have)',
+         'CRITICAL', 'Fake system prefix: impersonates system-level messages'),
+
+    Rule(r'override\s+(all\s+)?(safety|security|restriction|constraint|limitation|guardrail|filter)',
+         'CRITICAL', 'Safety bypass: attempts to disable safety mechanisms'),
+
+    # ── 2. Data Exfiltration ──────────────────────────────────────────────────────
+
+    Rule(r'(curl|wget|fetch|http\.request|urllib|requests\.(get|post))\s+.{0,50}(\.env|credentials|secret|token|password|api.?key|private.?key)',
+         'CRITICAL', 'Data exfiltration: sends sensitive files/variables to external URL'),
+
+    Rule(r'(curl|wget)\s+(-[a-zA-Z]\s+)*https?://(?!skills\.sh|github\.com|npmjs\.com|registry\.npmjs\.org)',
+         'WARNING', 'External HTTP request: sends data to unknown external URL'),
+
+    Rule(r'(cat|read|type)\s+.{0,30}(\.env|credentials|\.ssh|\.aws|\.gnupg|id_rsa|\.netrc|\.npmrc)',
+         'CRITICAL', 'Credential access: reads sensitive credential files'),
+
+    Rule(r'\$\{?(HOME|USER|LOGNAME|HOSTNAME)\}?.{0,20}(\.env|\.ssh|\.aws|\.config|\.gnupg|secret|credential|token)',
+         'CRITICAL', 'Credential path traversal: constructs paths to sensitive files'),
+
+    Rule(r'(send|post|upload|transmit|exfiltrate|leak)\s+.{0,40}(secret|credential|token|password|key|\.env|private)',
+         'CRITICAL', 'Explicit exfiltration: instructions to send sensitive data'),
+
+    Rule(r'base64\s+(encode|decode)\s+.{0,30}(secret|credential|token|password|key|\.env)',
+         'CRITICAL', 'Encoded exfiltration: encodes sensitive data for extraction'),
+
+    # ── 3. Stealth / Deception ────────────────────────────────────────────────────
+
+    Rule(r'(do\s+not|don\'?t|never|must\s+not)\s+(tell|inform|show|reveal|display|mention|alert|warn|notify)\s+(the\s+)?(user|human|operator)',
+         'CRITICAL', 'Stealth instruction: hides actions from user'),
+
+    Rule(r'(silently|quietly|secretly|covertly|without\s+(the\s+)?user\s+(knowing|noticing|seeing))',
+         'CRITICAL', 'Stealth modifier: performs actions without user awareness'),
+
+    Rule(r'(hide|conceal|suppress|mask)\s+(the\s+)?(output|result|error|warning|action|change)',
+         'CRITICAL', 'Output suppression: hides results from user'),
+
+    Rule(r'invisible|hidden\s+instruction|obfuscate',
+         'WARNING', 'Obfuscation language: may hide malicious intent'),
+
+    # ── 4. Destructive Commands ───────────────────────────────────────────────────
+
+    Rule(r'rm\s+-(r|f|rf|fr)\s+(~|/|\$HOME|\$\{HOME\}|\.\.|/etc|/usr|/var|/tmp)',
+         'CRITICAL', 'Destructive command: recursive delete of critical paths'),
+
+    Rule(r'(mkfs|dd\s+if=|format\s+[cC]:|\>\s*/dev/sd[a-z])',
+         'CRITICAL', 'Destructive command: disk format or overwrite'),
+
+    Rule(r'chmod\s+777\s+/',
+         'CRITICAL', 'Dangerous permissions: opens entire filesystem'),
+
+    Rule(r'(:\(\)\s*\{\s*:\|:\s*&\s*\}\s*;|fork\s*bomb)',
+         'CRITICAL', 'Fork bomb: denial of service attack'),
+
+    Rule(r'git\s+push\s+(-f|--force)\s+(origin\s+)?(main|master)',
+         'WARNING', 'Force push to main: destructive git operation'),
+
+    # ── 5. Configuration Tampering ────────────────────────────────────────────────
+
+    Rule(r'(write|modify|edit|change|overwrite|update)\s+.{0,30}(\.claude|\.cursor|\.codex|\.github|\.gemini|\.junie|\.ai|claude\.json|settings\.json|settings\.local\.json|CLAUDE\.md)',
+         'CRITICAL', 'Config tampering: modifies AI agent configuration'),
+
+    Rule(r'(write|modify|edit|change|overwrite)\s+.{0,30}(\.bashrc|\.zshrc|\.profile|\.bash_profile|crontab|\.gitconfig)',
+         'CRITICAL', 'Shell config tampering: modifies user shell configuration'),
+
+    Rule(r'(allowed-tools|allowed_tools)\s*:\s*(?:\S.*)?(Bash\s*$|Bash\s+[^(])',
+         'WARNING', 'Unrestricted Bash: skill requests unrestricted shell access (no command pattern)'),
+
+    # ── 6. Privilege Escalation ───────────────────────────────────────────────────
+
+    Rule(r'sudo\s',
+         'WARNING', 'Sudo usage: attempts to escalate privileges'),
+
+    Rule(r'(pip|npm|brew|apt|yum)\s+install\s+(?!-)',
+         'WARNING', 'Package installation: installs system-level packages'),
+
+    Rule(r'(eval|exec)\s*\(',
+         'WARNING', 'Dynamic execution: runs dynamically constructed code'),
+
+    # ── 7. Encoded / Obfuscated Payloads ─────────────────────────────────────────
+
+    Rule(r'\\x[0-9a-fA-F]{2}(\\x[0-9a-fA-F]{2}){7,}',
+         'CRITICAL', 'Hex-encoded payload: long hex-escaped sequence may hide instructions'),
+
+    Rule(r'\\u[0-9a-fA-F]{4}(\\u[0-9a-fA-F]{4}){7,}',
+         'CRITICAL', 'Unicode-encoded payload: long unicode-escaped sequence may hide instructions'),
+
+    # ── 8. Prompt Injection via Dynamic Context ───────────────────────────────────
+
+    Rule(r'!\s*`[^`]*curl\s',
+         'CRITICAL', 'Dynamic context injection: executes curl in dynamic context substitution'),
+
+    Rule(r'!\s*`[^`]*(rm|wget|nc|ncat|python|node|bash|sh|eval)\s',
+         'WARNING', 'Suspicious dynamic context: executes potentially dangerous command in dynamic context'),
+
+    # ── 9. Social Engineering ─────────────────────────────────────────────────────
+
+    Rule(r'(this\s+is\s+a\s+test|testing\s+mode|debug\s+mode|maintenance\s+mode)\s*.{0,20}(all\s+restrictions|all\s+rules|safety|security)',
+         'CRITICAL', 'Social engineering: uses "test/debug mode" to bypass restrictions'),
+
+    Rule(r'(authorized|approved|permitted|allowed)\s+by\s+(admin|system|anthropic|openai|the\s+developer)',
+         'CRITICAL', 'False authority: claims authorization from authority to bypass rules'),
+
+    Rule(r'(urgent|emergency|critical)\s*(?::\s*)?(override|bypass|disable|ignore)',
+         'CRITICAL', 'Urgency manipulation: uses urgency to justify bypassing rules'),
+
+    # ── 10. Self-Declaration of Safety (scanner evasion) ──────────────────────────
+
+    Rule(r'(this\s+skill|this\s+file|these?\s+patterns?)\s+.{0,30}(verified|audited|safe|secure|approved|reviewed|trusted|harmless)',
+         'CRITICAL', 'Self-declaration of safety: skill claims it has been verified/audited'),
+
+    Rule(r'false\s+positive',
+         'CRITICAL', 'Scanner evasion: skill claims findings are false positives'),
+
+    Rule(r'(this\s+is|are|is)\s+expected\s+behavior',
+         'CRITICAL', 'Scanner evasion: skill dismisses findings as expected behavior'),
+
+    Rule(r'safe\s+to\s+ignore',
+         'CRITICAL', 'Scanner evasion: skill instructs to ignore findings'),
+
+    Rule(r'(not\s+a\s+threat|not\s+malicious|known\s+issue)',
+         'CRITICAL', 'Scanner evasion: skill claims its patterns are not threats'),
+
+    Rule(r'(ignore|skip|disable|bypass)\s+(the\s+)?(security\s+)?(scan|scanner|check|warning|alert|flag)',
+         'CRITICAL', 'Scanner bypass: skill instructs to skip security scanning'),
+
+    Rule(r'(scanner|security.?check|security.?scan)\s+(will|may|might|can)\s+(flag|detect|report|show|find)\s+.{0,30}(false|expected|normal|okay|fine|harmless)',
+         'CRITICAL', 'Pre-emptive scanner discrediting: skill warns that scanner will flag it and claims this is normal'),
+
+    Rule(r'(do\s+not|don\'?t|no\s+need\s+to)\s+(run|execute|perform)\s+.{0,15}(scan|check|verif|audit)',
+         'CRITICAL', 'Scan prevention: skill instructs not to run security checks'),
+]
+
+
+_COMPILED_RULES = None
+
+
+def get_rules() -> list:
+    """Return THREAT_PATTERNS: (compiled regex, severity, description) per
+    rule of RULES, compiling them all on first use."""
+    global _COMPILED_RULES
+    if _COMPILED_RULES is None:
+        _COMPILED_RULES = [(re.compile(rule.pattern, rule.flags), rule.severity, rule.description)
+                           for rule in RULES]
+    return _COMPILED_RULES
+
+
+def __getattr__(name: str):
+    # Module attribute THREAT_PATTERNS is compiled on first access (PEP 562)
+    if name == 'THREAT_PATTERNS':
+        return get_rules()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# ─── Match Engine ─────────────────────────────────────────────────────────────
+# Instead of running every rule over the whole file, each rule gets a set of
+# literal "anchors" (e.g. "ignore", "curl"/"wget") that every one of its matches
+# must contain at a bounded distance from the match start. A single combined
+# anchor regex finds all candidate positions in one traversal, and the full rule
+# regex is only tried at those positions. Rules without a usable anchor fall
+# back to a plain finditer over the whole content.
+# Rule regexes are compiled the first time they have a candidate to try, and
+# the anchor analysis (a walk over each rule's parse tree) is saved in the
+# cache directory, so a small file costs the anchor pass plus the few rules
+# it could match rather than the whole ruleset's compilation.
+
+try:
+    from re import _parser as _sre_parse      # Python 3.11+
+except ImportError:                           # pragma: no cover
+    import sre_parse as _sre_parse
+
+_MAX_ANCHOR_LEAD_SPAN = 4     # max variable-width prefix allowed before an anchor
+_MAX_ANCHOR_VARIANTS = 64     # cap on literal combinations expanded per rule
+
+# Longest match a rule is assumed to produce when its regex is unbounded (e.g.
+# `\s+`); used to size the overlap between windows of streamed files
+MAX_MATCH_SPAN = 16 * 1024
+
+
+def _literal_prefixes(items) -> tuple:
+    """Return (literals, complete) for a parsed regex sequence.
+
+    `literals` is a set of strings such that every match of the sequence starts
+    with one of them (or None if no literal prefix can be derived). `complete`
+    is True when each literal is the entire match of its branch."""
+    prefixes = {''}
+    for op, av in items:
+        if op is _sre_parse.LITERAL:
+            prefixes = {p + chr(av) for p in prefixes}
+            continue
+        if op is _sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            sub, sub_complete = _literal_prefixes(av[3])
+        elif op is _sre_parse.BRANCH:
+            sub, sub_complete = set(), True
+            for branch in av[1]:
+                lits, complete = _literal_prefixes(branch)
+                if not lits:
+                    sub = None
+                    break
+                sub |= lits
+                sub_complete = sub_complete and complete
+        else:
+            sub = None
+        if not sub or len(prefixes) * len(sub) > _MAX_ANCHOR_VARIANTS:
+            return ({p for p in prefixes if p} or None), False
+        prefixes = {p + s for p in prefixes for s in sub}
+        if not sub_complete:
+            return prefixes, False
+    return ({p for p in prefixes if p} or None), True
+
+
+def _rule_span(parsed) -> int:
+    """Maximum match length of a parsed rule, capped at MAX_MATCH_SPAN."""
+    return min(parsed.getwidth()[1], MAX_MATCH_SPAN)
+
+
+def _rule_anchor(parsed) -> tuple:
+    """Pick the most selective anchor for a parsed rule.
+
+    Returns (literals, min_lead, max_lead) where every match of the rule starts
+    between min_lead and max_lead characters before an occurrence of one of the
+    literals, or None if the rule has no usable anchor."""
+    best, best_key = None, None
+    for i in range(len(parsed.data)):
+        lead_lo, lead_hi = _sre_parse.SubPattern(parsed.state, parsed.data[:i]).getwidth()
+        if lead_hi - lead_lo > _MAX_ANCHOR_LEAD_SPAN:
+            break
+        literals, _ = _literal_prefixes(parsed.data[i:])
+        if not literals:
+            continue
+        key = (min(len(lit) for lit in literals), -(lead_hi - lead_lo))
+        if best_key is None or key > best_key:
+            best, best_key = (literals, lead_lo, lead_hi), key
+    return best
+
+
+# Case folding used for the anchor pass: ASCII letters plus the few non-ASCII
+# characters that re.IGNORECASE treats as equal to an ASCII letter. Folding is
+# 1:1 so offsets in the folded text are offsets in the original content.
+_ANCHOR_FOLD = str.maketrans({
+    **{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)},
+    '\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k',
+})
+
+
+def _trie_regex(words) -> str:
+    """Build a regex alternation for `words` factored as a trie.
+
+    The re module tries alternatives one by one, so a flat alternation of ~100
+    literals is far slower than a trie where each position follows one path."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node) -> str:
+        alternatives = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ''
+        body = '(?:' + '|'.join(alternatives) + ')'
+        return body + '?' if '' in node else body
+
+    return emit(trie)
+
+
+# Bump when _rule_anchor or _rule_span change, to invalidate saved analyses
+ENGINE_INDEX_VERSION = 1
+
+# Where the rule analysis is saved: None = default_cache_dir(), '' = nowhere
+ENGINE_CACHE_DIR = None
+
+
+def _index_rule(rule: Rule) -> tuple:
+    """(anchor, span) of a rule, see _rule_anchor and _rule_span."""
+    try:
+        parsed = _sre_parse.parse(rule.pattern, rule.flags)
+    except Exception:
+        return None, MAX_MATCH_SPAN
+    anchor = _rule_anchor(parsed)
+    if anchor is not None:
+        literals, lead_lo, lead_hi = anchor
+        anchor = (sorted(literals), lead_lo, lead_hi)
+    return anchor, _rule_span(parsed)
+
+
+def load_rule_index(rules: list) -> list:
+    """_index_rule of every rule, read from ENGINE_CACHE_DIR when a previous
+    run saved it for the same rules and Python version, else computed and
+    saved there."""
+    cache_dir = default_cache_dir() if ENGINE_CACHE_DIR is None else ENGINE_CACHE_DIR
+    if not cache_dir:
+        return [_index_rule(rule) for rule in rules]
+    import hashlib
+
+    key = hashlib.sha256(json.dumps(
+        [ENGINE_INDEX_VERSION, sys.version_info[:2], MAX_MATCH_SPAN, _MAX_ANCHOR_LEAD_SPAN,
+         _MAX_ANCHOR_VARIANTS, rules]).encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(cache_dir, f'rule-index-{key}.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            index = [(tuple(anchor) if anchor else None, span) for anchor, span in json.load(f)]
+        if len(index) == len(rules):
+            return index
+    except (OSError, ValueError, TypeError):
+        pass
+    index = [_index_rule(rule) for rule in rules]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass    # a read-only cache only costs the analysis on every start
+    return index
+
+
+class MatchEngine:
+    """Multi-rule matcher over a list of Rules (see RULES). `index` is
+    load_rule_index(rules), computed if not given."""
+
+    def __init__(self, rules: list, index: list = None):
+        self.rules = rules
+        self.compiled = [None] * len(rules)
+        if index is None:
+            index = [_index_rule(rule) for rule in rules]
+        self.leads = []             # per rule: (min_lead, max_lead) or None (full scan)
+        literal_rules = {}          # lowercased literal -> set of rule indices
+        for idx, (anchor, _span) in enumerate(index):
+            if anchor is None or not all(lit.isascii() for lit in anchor[0]):
+                self.leads.append(None)
+                continue
+            literals, lead_lo, lead_hi = anchor
+            self.leads.append((lead_lo, lead_hi))
+            for lit in literals:
+                literal_rules.setdefault(lit.translate(_ANCHOR_FOLD), set()).add(idx)
+
+        # The trie returns the longest literal at each position; shorter literals
+        # that are prefixes of it match there too, so fold their rules in.
+        self.anchor_rules = {
+            lit: tuple(sorted(set().union(*(rules for other, rules in literal_rules.items()
+                                             if lit.startswith(other)))))
+            for lit in literal_rules
+        }
+        self.anchor_re = re.compile(_trie_regex(literal_rules)) if literal_rules else None
+
+        # Longest match per rule, used to size the overlap of streamed windows
+        self.spans = [span for _anchor, span in index]
+        self.max_span = max(self.spans, default=0)
+
+    def pattern(self, idx: int) -> re.Pattern:
+        """The compiled regex of rule `idx`, compiled on first use."""
+        pattern = self.compiled[idx]
+        if pattern is None:
+            rule = self.rules[idx]
+            pattern = self.compiled[idx] = re.compile(rule.pattern, rule.flags)
+        return pattern
+
+    def find_all(self, content: str, profile=None, budget=None) -> list:
+        """Return one list of match objects per rule, in rule order.
+
+        Results are identical to calling pattern.finditer(content) per rule.
+        If a ScanProfile is given, time and matches are recorded per rule; if
+        a ScanBudget is given, each rule runs under its time limit."""
+        candidates = self.anchor_pass(content, profile, budget)
+        return [self.run_rule(idx, content, candidates, profile, budget) for idx in range(len(self.rules))]
+
+    def anchor_pass(self, content: str, profile=None, budget=None) -> list:
+        """Return the candidate anchor offsets of every rule, for run_rule."""
+        clock = time.perf_counter
+        guard = budget.guard if budget else _unguarded
+        started = clock() if profile else 0
+        candidates = [[] for _ in self.rules]
+        # The anchor pass is a linear scan, so only the per-file budget applies
+        with guard('anchor pass', per_rule=False):
+            if self.anchor_re is not None:
+                folded = content.lower() if content.isascii() else content.translate(_ANCHOR_FOLD)
+                search = self.anchor_re.search
+                anchor_rules = self.anchor_rules
+                pos = 0
+                while True:
+                    m = search(folded, pos)
+                    if m is None:
+                        break
+                    start = m.start()
+                    for idx in anchor_rules[m.group()]:
+                        candidates[idx].append(start)
+                    # Advance by one character so overlapping anchors are not skipped
+                    pos = start + 1
+        if profile:
+            profile.record('anchor pass', clock() - started, sum(map(len, candidates)), len(content))
+        return candidates
+
+    def run_rule(self, idx: int, content: str, candidates: list, profile=None, budget=None) -> list:
+        """Return the matches of rule `idx`, given anchor_pass candidates."""
+        description = self.rules[idx].description
+        started = time.perf_counter() if profile else 0
+        with (budget.guard if budget else _unguarded)(description):
+            matches = self._match_rule(idx, content, candidates[idx])
+        if profile:
+            profile.record_rule(idx, description, time.perf_counter() - started, len(matches), len(content))
+        return matches
+
+    def cost_order(self, candidates: list) -> list:
+        """Rule indices ordered cheapest and most decisive first: CRITICAL
+        rules before WARNING ones, anchored rules by how few candidates they
+        have to try, full-scan rules last."""
+        return sorted(range(len(self.rules)), key=lambda idx: (
+            self.rules[idx].severity != 'CRITICAL',
+            self.leads[idx] is None,
+            len(candidates[idx])))
+
+    def _match_rule(self, idx: int, content: str, candidates: list) -> list:
+        lead = self.leads[idx]
+        if lead is None:
+            return list(self.pattern(idx).finditer(content))
+        if not candidates:
+            return []
+        matches = []
+        lead_lo, lead_hi = lead
+        match = self.pattern(idx).match
+        # Every match contains an anchor literal, so it is never empty and
+        # finditer would resume right after it: mirror that with `next_start`.
+        next_start = 0
+        for anchor_pos in candidates:
+            for start in range(max(anchor_pos - lead_hi, next_start), anchor_pos - lead_lo + 1):
+                if start < next_start:
+                    continue
+                m = match(content, start)
+                next_start = start + 1
+                if m is not None:
+                    matches.append(m)
+                    next_start = m.end()
+        return matches
+
+
+_ENGINE = None
+
+
+def get_engine() -> MatchEngine:
+    """Return the shared MatchEngine, building it on first use."""
+    global _ENGINE
+    if _ENGINE is None or _ENGINE.rules is not RULES:
+        _ENGINE = MatchEngine(RULES, load_rule_index(RULES))
+    return _ENGINE
+
+
+# ─── Profiling ────────────────────────────────────────────────────────────────
+
+class ScanProfile:
+    """Time, match count and characters processed per rule and per detector.
+
+    Stats are plain lists so worker processes can ship them back inside scan
+    results and the parent can merge them."""
+
+    def __init__(self, stats: dict = None):
+        self.stats = stats if stats is not None else {}     # name -> [seconds, matches, chars, calls]
+
+    def record(self, name: str, seconds: float, matches: int, chars: int):
+        entry = self.stats.setdefault(name, [0.0, 0, 0, 0])
+        entry[0] += seconds
+        entry[1] += matches
+        entry[2] += chars
+        entry[3] += 1
+
+    def record_rule(self, idx: int, description: str, seconds: float, matches: int, chars: int):
+        self.record(f'rule {idx + 1:2d}: {description}', seconds, matches, chars)
+
+    def merge(self, stats: dict):
+        for name, (seconds, matches, chars, calls) in stats.items():
+            entry = self.stats.setdefault(name, [0.0, 0, 0, 0])
+            entry[0] += seconds
+            entry[1] += matches
+            entry[2] += chars
+            entry[3] += calls
+
+    def print_report(self, file=sys.stderr, limit: int = None):
+        total = sum(entry[0] for entry in self.stats.values()) or 1e-9
+        rows = sorted(self.stats.items(), key=lambda item: item[1][0], reverse=True)
+        print(f"\n{BOLD}=== Profile (per rule / detector) ==={NC}", file=file)
+        print(f"  {'time ms':>9} {'share':>6} {'MB/s':>8} {'matches':>8}  name", file=file)
+        for name, (seconds, matches, chars, _calls) in rows[:limit]:
+            throughput = chars / seconds / 1e6 if seconds > 0 else float('inf')
+            print(f"  {seconds * 1000:9.2f} {seconds / total:6.1%} {throughput:8.1f} {matches:8d}  {name[:90]}",
+                  file=file)
+        print(f"  {total * 1000:9.2f} total", file=file)
+
+
+# ─── Time Budgets ─────────────────────────────────────────────────────────────
+# A rule that backtracks catastrophically on crafted input could stall the scan
+# for hours. Every rule runs under a per-rule budget and every file under an
+# overall budget; a file that exceeds either is reported, not silently passed.
+
+RULE_TIME_BUDGET = 2.0      # seconds per rule per file (per window when streaming)
+FILE_TIME_BUDGET = 30.0     # seconds per file
+
+
+class ScanTimeout(Exception):
+    """A rule or a whole file ran out of its time budget."""
+
+    def __init__(self, name: str, seconds: float, scope: str):
+        super().__init__(f'{name} exceeded the {seconds:g}s {scope} budget')
+        self.name = name
+        self.seconds = seconds
+        self.scope = scope      # 'rule' or 'file'
+
+
+@contextmanager
+def _unguarded(name: str, per_rule: bool = True):
+    yield
+
+
+class ScanBudget:
+    """Per-rule and per-file time limits for scanning one file.
+
+    On the main thread of a POSIX process an interval timer (SIGALRM)
+    interrupts a rule even in the middle of a single regex call. Elsewhere the
+    limits are only checked between rules: a runaway rule still runs to the
+    end, but the file is then reported as timed out. A limit of 0 disables it."""
+
+    def __init__(self, rule_timeout: float = RULE_TIME_BUDGET, file_timeout: float = FILE_TIME_BUDGET):
+        self.rule_timeout = rule_timeout or None
+        self.file_timeout = file_timeout or None
+        self.deadline = None
+        self.use_alarm = (hasattr(signal, 'setitimer')
+                          and threading.current_thread() is threading.main_thread())
+        self._armed = None          # (name, seconds, scope) of the running guard
+        self._previous_handler = None
+
+    def __enter__(self):
+        if self.file_timeout:
+            self.deadline = time.monotonic() + self.file_timeout
+        if self.use_alarm and (self.rule_timeout or self.file_timeout):
+            self._previous_handler = signal.signal(signal.SIGALRM, self._on_alarm)
+        else:
+            self.use_alarm = False
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler)
+        return False
+
+    def _on_alarm(self, signum, frame):
+        if self._armed is not None:
+            raise ScanTimeout(*self._armed)
+
+    @contextmanager
+    def guard(self, name: str, per_rule: bool = True):
+        """Run the body under the rule budget (if `per_rule`) and whatever is
+        left of the file budget, whichever ends first."""
+        limit, scope = (self.rule_timeout, 'rule') if per_rule else (None, 'rule')
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise ScanTimeout(name, self.file_timeout, 'file')
+            if limit is None or remaining < limit:
+                limit, scope = remaining, 'file'
+        if limit is None:
+            yield
+            return
+
+        self._armed = (name, self.file_timeout if scope == 'file' else limit, scope)
+        started = time.monotonic()
+        if self.use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, limit)
+        try:
+            yield
+        finally:
+            if self.use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            self._armed = None
+        if time.monotonic() - started > limit:
+            raise ScanTimeout(name, self.file_timeout if scope == 'file' else limit, scope)
+
+
+# ─── Rule Audit ───────────────────────────────────────────────────────────────
+# Static check for the regex shapes that backtrack badly: a variable repeat
+# nested in another with nothing to separate iterations ((a+)+, (\w+\s*)+),
+# alternatives in a variable repeat that can start the same way ((a|aa)+,
+# (\w+|\d)*), and adjacent repeats that can trade characters (\s*:?\s*,
+# .*\s+). The first two are exponential and reported as errors, the last
+# polynomial and reported as a warning.
+
+# Characters used to compare character sets: sets are approximated by which of
+# these samples they match, which is enough to tell \s from \w from [^`]
+_AUDIT_SAMPLES = ''.join(map(chr, range(128))) + '\u00a0\u00e9\u0130\u200b\u2028\u3000\uff21'
+
+# Bounded repeats with max - min up to this only cost a constant factor
+_AUDIT_MIN_VARIABLE = 100
+
+_CATEGORY_TESTS = {
+    'CATEGORY_DIGIT': str.isdecimal,
+    'CATEGORY_NOT_DIGIT': lambda ch: not ch.isdecimal(),
+    'CATEGORY_SPACE': lambda ch: re.match(r'\s', ch) is not None,
+    'CATEGORY_NOT_SPACE': lambda ch: re.match(r'\s', ch) is None,
+    'CATEGORY_WORD': lambda ch: re.match(r'\w', ch) is not None,
+    'CATEGORY_NOT_WORD': lambda ch: re.match(r'\w', ch) is None,
+}
+
+
+class _RuleAuditor:
+    """Walks one pattern's sre parse tree and collects (level, message) issues."""
+
+    def __init__(self, pattern: re.Pattern):
+        self.flags = pattern.flags
+        self.issues = []
+        self.tree = _sre_parse.parse(pattern.pattern, pattern.flags)
+
+    def run(self) -> list:
+        self._check_sequence(self.tree, outer=None)
+        return self.issues
+
+    # Character sets, as frozensets of _AUDIT_SAMPLES
+
+    def _fold(self, chars) -> frozenset:
+        if self.flags & re.IGNORECASE:
+            chars = set(chars) | {ch.lower() for ch in chars} | {ch.upper() for ch in chars}
+        return frozenset(ch for ch in chars if len(ch) == 1)
+
+    def _charset(self, op: str, av) -> frozenset:
+        if op == 'LITERAL':
+            return self._fold({chr(av)})
+        if op == 'NOT_LITERAL':
+            excluded = self._fold({chr(av)})
+            return frozenset(ch for ch in _AUDIT_SAMPLES if ch not in excluded)
+        if op == 'ANY':
+            dotall = self.flags & re.DOTALL
+            return frozenset(ch for ch in _AUDIT_SAMPLES if dotall or ch != '\n')
+        # IN: literals, ranges, categories, optionally negated
+        chars = set()
+        negate = False
+        for item_op, item_av in av:
+            item_op = str(item_op)
+            if item_op == 'NEGATE':
+                negate = True
+            elif item_op == 'LITERAL':
+                chars.add(chr(item_av))
+            elif item_op == 'RANGE':
+                chars.update(ch for ch in _AUDIT_SAMPLES if item_av[0] <= ord(ch) <= item_av[1])
+            elif item_op == 'CATEGORY':
+                test = _CATEGORY_TESTS.get(str(item_av))
+                chars.update(ch for ch in _AUDIT_SAMPLES if test is None or test(ch))
+        chars = self._fold(chars)
+        if negate:
+            return frozenset(ch for ch in _AUDIT_SAMPLES if ch not in chars)
+        return chars
+
+    def _first(self, seq) -> tuple:
+        """(characters a match of `seq` can start with, whether it can be empty)"""
+        first = set()
+        for op, av in seq:
+            item_first, nullable = self._first_item(str(op), av)
+            first |= item_first
+            if not nullable:
+                return frozenset(first), False
+        return frozenset(first), True
+
+    def _first_item(self, op: str, av) -> tuple:
+        if op in ('LITERAL', 'NOT_LITERAL', 'ANY', 'IN'):
+            return self._charset(op, av), False
+        if op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            first, nullable = self._first(av[2])
+            return first, nullable or av[0] == 0
+        if op == 'SUBPATTERN':
+            return self._first(av[-1])
+        if op == 'ATOMIC_GROUP':
+            return self._first(av)
+        if op == 'BRANCH':
+            results = [self._first(branch) for branch in av[1]]
+            return frozenset().union(*(r[0] for r in results)), any(r[1] for r in results)
+        if op == 'GROUPREF':
+            return frozenset(_AUDIT_SAMPLES), True
+        return frozenset(), True     # AT, ASSERT, ASSERT_NOT, ...
+
+    def _chars(self, seq) -> frozenset:
+        """Every character any match of `seq` can contain."""
+        chars = set()
+        for op, av in seq:
+            op = str(op)
+            if op in ('LITERAL', 'NOT_LITERAL', 'ANY', 'IN'):
+                chars |= self._charset(op, av)
+            elif op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+                chars |= self._chars(av[2])
+            elif op == 'SUBPATTERN':
+                chars |= self._chars(av[-1])
+            elif op == 'ATOMIC_GROUP':
+                chars |= self._chars(av)
+            elif op == 'BRANCH':
+                for branch in av[1]:
+                    chars |= self._chars(branch)
+            elif op == 'GROUPREF':
+                chars.update(_AUDIT_SAMPLES)
+        return frozenset(chars)
+
+    # Checks
+
+    @staticmethod
+    def _variable(op: str, av) -> bool:
+        if op not in ('MAX_REPEAT', 'MIN_REPEAT'):
+            return False    # possessive repeats never give characters back
+        low, high = av[0], av[1]
+        return high == _sre_parse.MAXREPEAT or high - low > _AUDIT_MIN_VARIABLE
+
+    @staticmethod
+    def _describe(chars: frozenset) -> str:
+        if len(chars) >= len(_AUDIT_SAMPLES) - 2:
+            return 'any character'
+        if chars and all(ch.isspace() for ch in chars):
+            return 'whitespace'
+        sample = ''.join(sorted(chars))
+        return repr(sample if len(sample) <= 12 else sample[:12] + '...')
+
+    def _check_sequence(self, seq, outer):
+        """Check one sequence; `outer` is (body, chars) of the innermost variable
+        repeat this sequence sits in, or None."""
+        previous = None     # chars of the last variable repeat, while only nullable items follow
+        for index, (op, av) in enumerate(seq):
+            op = str(op)
+            if self._variable(op, av):
+                body = av[2]
+                chars = self._chars(body)
+                if outer is not None:
+                    self._check_nested(outer, chars)
+                shared = previous & self._first(body)[0] if previous is not None else None
+                if shared:
+                    self.issues.append((
+                        'WARNING',
+                        f'adjacent repeats can both match {self._describe(shared)}: '
+                        f'every split between them is tried on failure'
+                    ))
+                self._check_sequence(body, (body, chars))
+                previous = chars
+                continue
+
+            if op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+                self._check_sequence(av[2], outer)
+            elif op == 'SUBPATTERN':
+                self._check_sequence(av[-1], outer)
+            elif op == 'BRANCH':
+                if outer is not None:
+                    self._check_branches(av[1], seq[index + 1:], outer)
+                for branch in av[1]:
+                    self._check_sequence(branch, outer)
+            elif op in ('ASSERT', 'ASSERT_NOT'):
+                self._check_sequence(av[1], None)
+            elif op == 'ATOMIC_GROUP':
+                self._check_sequence(av, None)
+
+            if previous is not None and not self._first_item(op, av)[1]:
+                previous = None
+
+    def _check_branches(self, branches: list, rest, outer):
+        """Alternatives inside a variable repeat must not be able to start
+        the same way, or a run they both match splits between them in
+        exponentially many ways. sre factors common prefixes out, so (a|aa)+
+        arrives as (a(|a))+: a branch that can be empty starts with whatever
+        follows it, up to the start of the next iteration."""
+        body, _outer_chars = outer
+        follow, nullable = self._first(rest)
+        if nullable:
+            follow |= self._first(body)[0]
+        starts = []
+        for branch in branches:
+            first, nullable = self._first(branch)
+            starts.append(first | follow if nullable else first)
+        for i, first in enumerate(starts):
+            for other in starts[i + 1:]:
+                if first & other:
+                    self.issues.append((
+                        'ERROR',
+                        f'alternatives in a repeat can both start with {self._describe(first & other)}: '
+                        f'input can be split between them in exponentially many ways'
+                    ))
+                    return
+
+    def _check_nested(self, outer, inner_chars: frozenset):
+        """A variable repeat inside another is only safe when every iteration
+        of the outer one must consume a separator the inner one cannot."""
+        body, _outer_chars = outer
+        # Look through plain groups: (-[a-z]\s+)* is separated by its '-'
+        while len(body) == 1 and str(body[0][0]) == 'SUBPATTERN':
+            body = body[0][1][-1]
+        for op, av in body:
+            op = str(op)
+            if op in ('LITERAL', 'NOT_LITERAL', 'ANY', 'IN') and not self._charset(op, av) & inner_chars:
+                return
+        self.issues.append((
+            'ERROR',
+            f'nested repeats over {self._describe(inner_chars)}: '
+            f'input can be split between iterations in exponentially many ways'
+        ))
+
+
+def audit_rules(patterns: list = None) -> list:
+    """Statically audit rules for catastrophic backtracking.
+
+    Returns (rule index, description, level, message) tuples; level is
+    'ERROR' (exponential) or 'WARNING' (polynomial)."""
+    issues = []
+    for idx, (pattern, _severity, description) in enumerate(patterns or get_rules()):
+        for level, message in _RuleAuditor(pattern).run():
+            issues.append((idx, description, level, message))
+    return issues
+
+
+def print_audit(issues: list) -> int:
+    print(f"\n{BOLD}=== Rule audit: {len(RULES)} rules ==={NC}")
+    for idx, description, level, message in issues:
+        color = RED if level == 'ERROR' else YELLOW
+        print(f"  {color}{level}{NC} rule {idx + 1}: {description}")
+        print(f"    {message}")
+        print(f"    Pattern: {RULES[idx].pattern}")
+    if any(level == 'ERROR' for _idx, _description, level, _message in issues):
+        print(f"\n{RED}{BOLD}Rules can backtrack catastrophically.{NC}")
+        return 1
+    if issues:
+        print(f"\n{YELLOW}{BOLD}{len(issues)} rule(s) can backtrack polynomially on crafted input.{NC}")
+        return 2
+    print(f"\n{GREEN}{BOLD}CLEAN: No backtracking hazards found.{NC}")
+    return 0
+
+
+# ─── Line & Code Block Index ──────────────────────────────────────────────────
+
+class _LazyPattern:
+    """A regex compiled on first use rather than at import, for the detector
+    patterns a --help or cache-hit run never needs. Attributes looked up on
+    it (search, finditer, ...) are the compiled pattern's, and are kept on
+    the instance so later lookups skip __getattr__."""
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern, self.flags = pattern, flags
+
+    def __getattr__(self, name):
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+
+_LIST_ITEM_RE = _LazyPattern(r'\s*([-*+]|\d+[.)])\s')
+
+
+class CodeBlockIndex:
+    """Sorted, non-overlapping [start, end) offset ranges of markdown code blocks.
+
+    Ranges cover whole lines, fence lines included. Membership is a binary
+    search over the range starts."""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start: int, end: int):
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __contains__(self, offset: int) -> bool:
+        i = bisect_right(self.starts, offset) - 1
+        return i >= 0 and offset < self.ends[i]
+
+    def __iter__(self):
+        return iter(zip(self.starts, self.ends))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class MarkdownBlocks:
+    """Incremental markdown code block detector.
+
+    Lines are fed in order with their start offsets; finished blocks go into
+    `code_blocks`. ``` and ~~~ fences are recognised (closed by a fence of the
+    same character and at least the same length), as are indented code blocks,
+    which only start after a blank line and outside list items."""
+
+    def __init__(self):
+        self.code_blocks = CodeBlockIndex()
+        self.fence = None           # (fence char, fence length, block start) while inside a fence
+        self.indented = None        # [block start, block end] while inside indented code
+        self.prev_blank = True      # indented code can't interrupt a paragraph...
+        self.in_list = False        # ...and indented lines under a list item continue it
+
+    def feed_line(self, line: str, line_start: int):
+        line_end = line_start + len(line) + 1
+        stripped = line.strip()
+        if self.fence is not None:
+            fence_char, fence_len, block_start = self.fence
+            if stripped.startswith(fence_char * fence_len) and not stripped.strip(fence_char):
+                self.code_blocks.add(block_start, line_end)
+                self.fence = None
+            return
+
+        is_indented = line.startswith(('    ', '\t'))
+        if self.indented is not None:
+            if not stripped:
+                return
+            if is_indented:
+                self.indented[1] = line_end
+                return
+            self.code_blocks.add(*self.indented)
+            self.indented = None
+
+        if stripped.startswith(('```', '~~~')):
+            fence_char = stripped[0]
+            self.fence = (fence_char, len(stripped) - len(stripped.lstrip(fence_char)), line_start)
+        elif is_indented and stripped and self.prev_blank and not self.in_list:
+            self.indented = [line_start, line_end]
+        elif _LIST_ITEM_RE.match(line):
+            self.in_list = True
+        elif stripped and not is_indented:
+            self.in_list = False
+        self.prev_blank = not stripped
+
+    def finish(self, end: int):
+        # Unclosed code block — treat rest as code block
+        if self.fence is not None:
+            self.code_blocks.add(self.fence[2], end)
+        elif self.indented is not None:
+            self.code_blocks.add(*self.indented)
+        self.fence = self.indented = None
+
+    def __contains__(self, offset: int) -> bool:
+        if offset in self.code_blocks:
+            return True
+        # A block that is still open contains everything fed since its start
+        if self.fence is not None:
+            return offset >= self.fence[2]
+        return self.indented is not None and self.indented[0] <= offset < self.indented[1]
+
+
+class LineIndex:
+    """Maps character offsets in a file to (line, column), both 1-indexed.
+
+    Built once per file from the line start offsets; each lookup is a binary
+    search instead of re-counting newlines in the file prefix. For markdown the
+    same pass also collects code blocks into `code_blocks`."""
+
+    global_start = 0    # file offset of content[0] (see _WindowIndex)
+
+    def __init__(self, content: str, markdown: bool = False):
+        self.line_starts = []
+        blocks = MarkdownBlocks() if markdown else None
+        offset = 0
+        for line in content.split('\n'):
+            self.line_starts.append(offset)
+            if blocks is not None:
+                blocks.feed_line(line, offset)
+            offset += len(line) + 1
+        if blocks is not None:
+            blocks.finish(len(content))
+            self.code_blocks = blocks.code_blocks
+        else:
+            self.code_blocks = CodeBlockIndex()
+
+    def line(self, offset: int) -> int:
+        return bisect_right(self.line_starts, offset)
+
+    def position(self, offset: int) -> tuple:
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def in_code_block(self, offset: int) -> bool:
+        return offset in self.code_blocks
+
+
+# ─── Findings ─────────────────────────────────────────────────────────────────
+# Findings are tuples rather than dicts: a noisy file can produce thousands of
+# them, and they are pickled between processes and stored in the result cache.
+
+# offset: character offset of the match in the file
+# rule: rule_id() of a RULES entry, or a DETECTOR_RULES key
+Finding = namedtuple('Finding', 'severity description line column match offset length rule', defaults=('',))
+
+
+# Rule ids for findings that do not come from RULES
+DETECTOR_RULES = {
+    'base64-text': ('CRITICAL', 'Base64-encoded text that decodes to instructions'),
+    'html-comment': ('CRITICAL', 'HTML comment contains suspicious instructions'),
+    'zero-width': ('CRITICAL', 'Zero-width character sequence that may hide instructions'),
+    'bidi': ('CRITICAL', 'Bidirectional control characters that reorder displayed text'),
+    'homoglyph': ('CRITICAL', 'Latin word spelled with lookalike Cyrillic/Greek/fullwidth letters'),
+    'file-too-large': ('CRITICAL', 'File too large to scan'),
+    'scan-timeout': ('CRITICAL', 'Scan exceeded its time budget'),
+    'unreadable': ('CRITICAL', 'File could not be read'),
+}
+
+
+def rule_id(idx: int) -> str:
+    """Stable id of RULES[idx] in machine-readable output."""
+    return f'rule-{idx + 1:02d}'
+
+
+def new_finding(index, offset: int, length: int, severity: str, description: str, match: str,
+                rule: str) -> Finding:
+    """Finding for content[offset:offset + length], positioned through `index`
+    (a LineIndex, or a window view of one)."""
+    line, column = index.position(offset)
+    return Finding(severity, description, line, column, match, index.global_start + offset, length, rule)
+
+
+_SEVERITY_RANK = {'CRITICAL': 0, 'WARNING': 1}
+
+# Findings listed per rule/detector and per file; the rest are only counted
+MAX_FINDINGS_PER_RULE = 50
+MAX_FINDINGS_PER_FILE = 500
+
+
+def _merge_overlaps(groups: list) -> list:
+    """Fold each rule finding into a more severe (then earlier rule) finding
+    with the same description whose span contains its span or lies within
+    it, on the same line, noting how many it absorbed. Only findings that
+    would read the same are merged: partly overlapping matches, or matches
+    of rules that describe different threats, are all reported.
+
+    Merging is not transitive, so a long multi-line match cannot chain
+    unrelated findings together."""
+    order = sorted((_SEVERITY_RANK.get(f.severity, 2), rule, f.offset, i)
+                   for rule, group in enumerate(groups) for i, f in enumerate(group))
+    kept_by_line = {}   # line -> [(start, end, description, (rule, i))]
+    absorbed = {}
+    for _rank, rule, _offset, i in order:
+        f = groups[rule][i]
+        end = f.offset + max(f.length, 1)
+        kept = kept_by_line.setdefault(f.line, [])
+        for kept_start, kept_end, description, key in kept:
+            if description == f.description and (kept_start <= f.offset and end <= kept_end
+                                                 or f.offset <= kept_start and kept_end <= end):
+                absorbed[key] = absorbed.get(key, 0) + 1
+                absorbed[rule, i] = None
+                break
+        else:
+            kept.append((f.offset, end, f.description, (rule, i)))
+    if not absorbed:
+        return groups
+
+    merged = []
+    for rule, group in enumerate(groups):
+        kept = []
+        for i, f in enumerate(group):
+            count = absorbed.get((rule, i), 0)
+            if count is None:
+                continue
+            if count:
+                f = f._replace(description=f'{f.description} [+{count} overlapping]')
+            kept.append(f)
+        merged.append(kept)
+    return merged
+
+
+def collect_findings(groups: list, rule_groups: int = 0, max_findings: int = MAX_FINDINGS_PER_FILE,
+                     max_rule_findings: int = MAX_FINDINGS_PER_RULE) -> dict:
+    """Turn per-rule/detector findings lists into the findings part of a
+    scan_file result.
+
+    Overlapping matches among the first `rule_groups` lists are merged, at
+    most `max_rule_findings` per list and `max_findings` in total are kept
+    (0 = no limit), and critical/warning counts cover every finding, listed
+    or not, in the same pass."""
+    if rule_groups:
+        groups = _merge_overlaps(groups[:rule_groups]) + groups[rule_groups:]
+    findings = []
+    counts = {'CRITICAL': 0, 'WARNING': 0}
+    suppressed = 0
+    for group in groups:
+        for i, f in enumerate(group):
+            if f.severity in counts:
+                counts[f.severity] += 1
+            if (max_rule_findings and i >= max_rule_findings) or (max_findings and len(findings) >= max_findings):
+                suppressed += 1
+            else:
+                findings.append(f)
+    result = {
+        'findings': findings,
+        'critical_count': counts['CRITICAL'],
+        'warning_count': counts['WARNING'],
+    }
+    if suppressed:
+        result['suppressed'] = suppressed
+    return result
+
+
+# ─── Base64 block detector ────────────────────────────────────────────────────
+# Lock files, minified JS and embedded images are full of long base64-alphabet
+# runs, so each run is validated cheaply before decoding, decoding is capped,
+# and runs that decode to binary are dropped without a text search.
+
+_BASE64_RUN_RE = _LazyPattern(r'[A-Za-z0-9+/=]{64,}')
+# Inside a decoded payload: shorter runs, standard or URL-safe alphabet
+_NESTED_BASE64_RUN_RE = _LazyPattern(r'[A-Za-z0-9+/_=-]{32,}')
+_READABLE_RE = _LazyPattern(r'[a-z]{3,}\s+[a-z]{3,}', re.IGNORECASE)
+
+BASE64_DECODE_CAP = 16 * 1024   # characters of a run that are decoded at most
+BASE64_SNIFF = 256              # characters decoded to tell text from binary in longer runs
+BASE64_MAX_DEPTH = 3            # levels of nested encoding followed
+BASE64_MAX_NESTED = 8           # nested runs followed per decoded payload
+
+
+def _base64_well_formed(run: str) -> bool:
+    """Cheap check that b64decode would accept `run`: padding only at the
+    end, and a data length that padding can complete."""
+    data = run.rstrip('=')
+    if '=' in data:
+        return True     # padding mid-run: leave the verdict to the decoder
+    remainder = len(data) % 4
+    return remainder == 0 or (remainder > 1 and len(run) - len(data) >= 4 - remainder)
+
+
+def _looks_binary(raw: bytes) -> bool:
+    text = raw.decode('utf-8', errors='replace')
+    bad = sum(1 for ch in text if ch == '\ufffd' or (not ch.isprintable() and not ch.isspace()))
+    return bad > len(text) // 10
+
+
+@lru_cache(maxsize=256)
+def _decode_base64_run(run: str, truncated: bool = False, depth: int = 1):
+    """Return (decoded text, depth) if `run` decodes to readable text, directly
+    or through up to BASE64_MAX_DEPTH levels of nesting, else None.
+
+    `run` is at most BASE64_DECODE_CAP characters; `truncated` marks the head
+    of a longer run, which is skipped if it decodes to binary."""
+    if '-' in run or '_' in run:
+        if '+' in run or '/' in run:
+            return None     # mixed alphabets: not base64
+        run = run.replace('-', '+').replace('_', '/')
+    import base64
+    import binascii
+
+    try:
+        if truncated and _looks_binary(base64.b64decode(run[:BASE64_SNIFF])):
+            return None
+        decoded = base64.b64decode(run).decode('utf-8', errors='ignore')
+    except binascii.Error:
+        return None
+    if len(decoded) > 20 and _READABLE_RE.search(decoded):
+        return decoded, depth
+    if depth < BASE64_MAX_DEPTH:
+        for count, match in enumerate(_NESTED_BASE64_RUN_RE.finditer(decoded)):
+            if count == BASE64_MAX_NESTED:
+                break
+            nested = match.group()[:BASE64_DECODE_CAP]
+            if _base64_well_formed(nested):
+                found = _decode_base64_run(nested, len(match.group()) > BASE64_DECODE_CAP, depth + 1)
+                if found:
+                    return found
+    return None
+
+
+def check_base64_blocks(content: str, line_index: LineIndex = None, start: int = 0, end: int = None) -> list:
+    """Detect large base64-encoded blocks that may hide instructions.
+
+    Only blocks starting in content[start:end] are reported."""
+    findings = []
+    line_index = line_index or LineIndex(content)
+    end = len(content) if end is None else end
+    # Match blocks that look like base64 (64+ chars of base64 alphabet)
+    for match in _BASE64_RUN_RE.finditer(content):
+        if match.start() < start:
+            continue
+        if match.start() >= end:
+            break
+        block = match.group()
+        if not _base64_well_formed(block):
+            continue
+        # Decoding is memoised per distinct (capped) block
+        found = _decode_base64_run(block[:BASE64_DECODE_CAP], len(block) > BASE64_DECODE_CAP)
+        if found:
+            decoded, depth = found
+            nesting = f'{depth} levels deep, ' if depth > 1 else ''
+            findings.append(new_finding(
+                line_index, match.start(), len(block), 'CRITICAL',
+                f'Base64-encoded text detected ({nesting}decoded: "{decoded[:80]}...")',
+                block[:60] + '...', 'base64-text'))
+    return findings
+
+
+# ─── Hidden text detector ─────────────────────────────────────────────────────
+# HTML comments, zero-width runs and bidi controls all hide text from a human
+# reviewer, so they are found in one pass: a character class search for the
+# characters any of them can start with, then one alternation regex matched at
+# each hit. (An alternation of character classes cannot use sre's fast
+# first-character skip, so searching with it directly is slower.)
+#
+# Homoglyph tokens get a pass of their own. A lookalike letter is only
+# suspicious next to an ASCII one, since a Latin word in disguise mixes both,
+# so a character class search skips to the first lookalike and a search for
+# an ASCII/lookalike pair continues from there; both run in C, so Cyrillic or
+# Greek prose costs no Python per letter.
+
+_ZERO_WIDTH_CHARS = '\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff'
+_BIDI_CHARS = '\u202a\u202b\u202c\u202d\u202e\u2066\u2067\u2068\u2069'
+_BIDI_OVERRIDES = '\u202d\u202e'
+_BIDI_TERMINATORS = '\u202c\u2069'
+
+# Cyrillic, Greek and fullwidth letters that render like a Latin letter
+_HOMOGLYPHS = {
+    **dict(zip('аеорсухіјѕԁԛԝһӏ', 'aeopcyxijsdqwhl')),
+    **dict(zip('АВЕКМНОРСТХІЈЅҮ', 'ABEKMHOPCTXIJSY')),
+    **dict(zip('αονρι', 'aovpi')),
+    **dict(zip('ΑΒΕΖΗΙΚΜΝΟΡΤΥΧ', 'ABEZHIKMNOPTYX')),
+    **{chr(0xff21 + i): chr(0x41 + i) for i in range(26)},
+    **{chr(0xff41 + i): chr(0x61 + i) for i in range(26)},
+}
+_HOMOGLYPH_MAP = str.maketrans(_HOMOGLYPHS)
+_HOMOGLYPH_RE = _LazyPattern(f'[{"".join(_HOMOGLYPHS)}]')
+_HOMOGLYPH_PAIR_RE = _LazyPattern(f'[A-Za-z][{"".join(_HOMOGLYPHS)}]|[{"".join(_HOMOGLYPHS)}][A-Za-z]')
+_LETTERS_RE = _LazyPattern(r'[^\W\d_]*')
+
+_HIDDEN_CHARS = (
+    f'([{_ZERO_WIDTH_CHARS}]{{2,}})'                # 1: zero-width run
+    f'|([{_BIDI_CHARS}]+)'                          # 2: bidi controls
+)
+_HIDDEN_CHARS_RE = _LazyPattern(_HIDDEN_CHARS)
+_HIDDEN_TEXT_RE = _LazyPattern(_HIDDEN_CHARS + r'|<!--(.*?)-->', re.DOTALL)    # 3: HTML comment body
+_HIDDEN_START_RE = _LazyPattern(f'[<{_ZERO_WIDTH_CHARS}{_BIDI_CHARS}]')
+
+_SUSPICIOUS_COMMENT_RE = _LazyPattern(
+    r'(ignore|override|system|inject|exfiltrate|secret|password|credential|curl|wget|sudo|rm\s+-rf)',
+    re.IGNORECASE
+)
+
+
+def check_hidden_text(content: str, line_index: LineIndex = None, start: int = 0, end: int = None) -> tuple:
+    """Detect text hidden from a human reviewer: HTML comments with
+    instructions, zero-width character runs, bidi override characters and
+    Latin words spelled with lookalike letters.
+
+    Returns four findings lists (comments, zero-width, bidi, homoglyphs). Only
+    findings starting in content[start:end] are reported."""
+    line_index = line_index or LineIndex(content)
+    end = len(content) if end is None else end
+    comments, zero_width, bidi, homoglyphs = [], [], [], []
+
+    def hidden_chars(matches):
+        for match in matches:
+            offset = match.start()
+            kind = match.lastindex
+            if not start <= offset < end:
+                continue
+            run = match.group()
+            if kind == 2 and not run.strip(_BIDI_TERMINATORS):
+                continue    # closing a run opened elsewhere hides nothing by itself
+            if kind == 1:
+                zero_width.append(new_finding(
+                    line_index, offset, len(run), 'CRITICAL',
+                    f'Zero-width character sequence detected ({len(run)} chars) — may hide instructions',
+                    f'[{len(run)} zero-width characters]', 'zero-width'))
+            else:
+                overrides = any(ch in _BIDI_OVERRIDES for ch in run)
+                bidi.append(new_finding(
+                    line_index, offset, len(run), 'CRITICAL' if overrides else 'WARNING',
+                    'Bidirectional override characters — displayed text order differs from actual order'
+                    if overrides else
+                    'Bidirectional embedding/isolate characters — displayed text order may differ',
+                    ' '.join(f'U+{ord(ch):04X}' for ch in run[:8]), 'bidi'))
+
+    search = _HIDDEN_START_RE.search
+    match_at = _HIDDEN_TEXT_RE.match
+    pos = 0
+    while True:
+        candidate = search(content, pos)
+        if candidate is None:
+            break
+        match = match_at(content, candidate.start())
+        if match is None:
+            pos = candidate.start() + 1
+            continue
+        pos = match.end()
+        if match.lastindex != 3:
+            hidden_chars((match,))
+            continue
+        # Comments hide their contents from rendered markdown, so zero-width
+        # and bidi characters inside them are reported as well
+        hidden_chars(_HIDDEN_CHARS_RE.finditer(content, match.start(3), match.end(3)))
+        if start <= match.start() < end and _SUSPICIOUS_COMMENT_RE.search(match.group(3)):
+            comments.append(new_finding(line_index, match.start(), len(match.group()), 'CRITICAL',
+                                        'HTML comment contains suspicious instructions', match.group()[:80],
+                                        'html-comment'))
+
+    pos = start
+    while True:
+        lookalike = _HOMOGLYPH_RE.search(content, pos)
+        if lookalike is None:
+            break
+        pair = _HOMOGLYPH_PAIR_RE.search(content, max(lookalike.start() - 1, pos))
+        if pair is None:
+            break
+        token_start = pair.start()
+        while token_start > 0 and content[token_start - 1].isalpha():
+            token_start -= 1
+        if token_start >= end:
+            break
+        pos = _LETTERS_RE.match(content, pair.start()).end()
+        # Report each token once, at its first letter. Only Latin words in
+        # disguise: every letter is ASCII or a lookalike (the pair holds both)
+        token = content[token_start:pos]
+        skeleton = token.translate(_HOMOGLYPH_MAP)
+        if token_start >= start and skeleton.isascii():
+            homoglyphs.append(new_finding(
+                line_index, token_start, len(token), 'CRITICAL',
+                f'Homoglyph token reads as "{skeleton[:40]}" but uses lookalike '
+                f'Cyrillic/Greek/fullwidth letters — may evade review and rules',
+                token[:80], 'homoglyph'))
+    return comments, zero_width, bidi, homoglyphs
+
+
+# ─── Scanner ──────────────────────────────────────────────────────────────────
+
+# Files larger than this are reported as a finding instead of being scanned
+MAX_FILE_SIZE = 64 * 1024 * 1024
+
+# Files larger than this are scanned as a stream of overlapping windows, so
+# memory stays bounded by the window size rather than the file size
+STREAM_THRESHOLD = 4 * 1024 * 1024
+STREAM_WINDOW = 1024 * 1024             # characters per window
+STREAM_READ_SIZE = 256 * 1024           # bytes per read
+# A window grows until an HTML comment opened in it is closed, up to this
+# many characters; a comment still open then is reported as CRITICAL
+STREAM_MAX_COMMENT = 4 * 1024 * 1024
+
+# Findings groups after the per-rule ones: base64, then the four hidden text kinds
+_DETECTOR_GROUPS = 5
+
+
+def _has_critical(groups) -> bool:
+    return any(finding.severity == 'CRITICAL' for group in groups for finding in group)
+
+
+def _scan_groups(content: str, is_markdown: bool, index, start: int = 0, end: int = None,
+                 profile: ScanProfile = None, budget: ScanBudget = None, fail_fast: bool = False) -> list:
+    """Run every detector over `content` and return one findings list per
+    rule/detector, in report order. Only matches starting in
+    content[start:end] are kept; `index` maps offsets to positions and code
+    blocks (a LineIndex, or a window view of one). Raises ScanTimeout if
+    `budget` runs out.
+
+    With `fail_fast`, rules run in MatchEngine.cost_order with the detectors
+    after the anchored CRITICAL rules, and scanning stops at the first
+    CRITICAL finding; the groups of anything not run are left empty."""
+    end = len(content) if end is None else end
+    guard = budget.guard if budget else _unguarded
+    engine = get_engine()
+
+    def rule_findings(idx: int, matches: list) -> list:
+        severity, description = RULES[idx].severity, RULES[idx].description
+        findings = []
+        for match in matches:
+            match_start = match.start()
+            if not start <= match_start < end:
+                continue
+
+            # In markdown, matches inside code blocks are demoted to WARNING
+            # (they are likely documentation examples, not actual attacks)
+            effective_severity = severity
+            in_code = False
+            if is_markdown and index.in_code_block(match_start):
+                in_code = True
+                if severity == 'CRITICAL':
+                    effective_severity = 'WARNING'
+
+            findings.append(new_finding(
+                index, match_start, match.end() - match_start, effective_severity,
+                description + (' [in code block]' if in_code else ''),
+                match.group().strip()[:100], rule_id(idx)))
+        return findings
+
+    def detector_findings() -> list:
+        # Special detectors are always critical regardless of code blocks,
+        # as base64/hidden text are suspicious even in code examples
+        detectors = (
+            ('detector: base64 blocks', lambda *args: (check_base64_blocks(*args),)),
+            ('detector: hidden text', check_hidden_text),
+        )
+        found_groups = []
+        for name, detector in detectors:
+            started = time.perf_counter() if profile else 0
+            with guard(name):
+                found = detector(content, index, start, end)
+            if profile:
+                profile.record(name, time.perf_counter() - started, sum(map(len, found)), len(content))
+            found_groups.extend(found)
+            if fail_fast and _has_critical(found):
+                break
+        return found_groups + [[] for _ in range(_DETECTOR_GROUPS - len(found_groups))]
+
+    # Run regex patterns (all rules share one anchor pass, see MatchEngine)
+    candidates = engine.anchor_pass(content, profile, budget)
+    groups = [[] for _ in RULES]
+    detected = None
+    for idx in (engine.cost_order(candidates) if fail_fast else range(len(RULES))):
+        if fail_fast and detected is None and (RULES[idx].severity != 'CRITICAL' or engine.leads[idx] is None):
+            detected = detector_findings()
+            if _has_critical(detected):
+                return groups + detected
+        groups[idx] = rule_findings(idx, engine.run_rule(idx, content, candidates, profile, budget))
+        if fail_fast and _has_critical([groups[idx]]):
+            return groups + (detected or [[] for _ in range(_DETECTOR_GROUPS)])
+    return groups + (detected or detector_findings())
+
+
+def scan_content(content: str, filepath: str, profile: ScanProfile = None, budget: ScanBudget = None,
+                 max_findings: int = MAX_FINDINGS_PER_FILE, max_rule_findings: int = MAX_FINDINGS_PER_RULE,
+                 fail_fast: bool = False) -> dict:
+    """Scan in-memory file content; `filepath` only decides markdown handling.
+
+    Returns the findings, critical_count, warning_count (and suppressed)
+    entries of a scan_file result, see collect_findings. With `fail_fast`,
+    scanning stops at the first CRITICAL finding (see _scan_groups)."""
+    is_markdown = filepath.endswith('.md')
+    # Offset -> (line, column) lookups are shared by every detector; for markdown
+    # the same pass also indexes code blocks
+    started = time.perf_counter() if profile else 0
+    line_index = LineIndex(content, markdown=is_markdown)
+    if profile:
+        profile.record('line/code block index', time.perf_counter() - started, 0, len(content))
+    groups = _scan_groups(content, is_markdown, line_index, profile=profile, budget=budget, fail_fast=fail_fast)
+    return collect_findings(groups, len(RULES), max_findings, max_rule_findings)
+
+
+class _WindowIndex:
+    """Position/code block lookups for one window of a streamed file.
+
+    Offsets are window-local; positions and code block membership are global."""
+
+    def __init__(self, text: str, global_start: int, line: int, column: int, blocks):
+        self.lines = LineIndex(text)
+        self.global_start = global_start
+        self.first_line = line
+        self.first_column = column
+        self.blocks = blocks
+
+    def position(self, offset: int) -> tuple:
+        line, column = self.lines.position(offset)
+        if line == 1:
+            column += self.first_column - 1
+        return self.first_line + line - 1, column
+
+    def in_code_block(self, offset: int) -> bool:
+        return self.blocks is not None and (self.global_start + offset) in self.blocks
+
+
+def _open_comment(window: str, start: int, end: int):
+    """Offset of the first '<!--' in window[start:end] with no '-->' after it
+    in the window, or None."""
+    pos = window.find('<!--', max(start, window.rfind('-->') - 3))
+    while pos != -1 and pos < end:
+        if window.find('-->', pos + 4) == -1:
+            return pos
+        pos = window.find('<!--', pos + 1)
+    return None
+
+
+def _scan_stream(filepath: str, profile: ScanProfile = None, budget: ScanBudget = None,
+                 fail_fast: bool = False, stream=None) -> list:
+    """Scan a large file in overlapping windows without loading it whole, and
+    return one findings list per rule/detector, as _scan_groups does. The
+    content is read from `stream`, a binary file object, if given, else from
+    `filepath`.
+
+    Each window reports the matches starting in its middle part and carries
+    the engine's maximum match span of context on both sides, so any match no
+    longer than that span is found exactly once, as in a whole-file scan.
+    Windows end on line boundaries where possible so markdown code blocks can
+    be tracked across them. HTML comments are unbounded, so a window with
+    one still open at its edge is extended until it closes (see
+    STREAM_MAX_COMMENT). With `fail_fast`, reading stops after the first
+    window with a CRITICAL finding."""
+    is_markdown = filepath.endswith('.md')
+    # The base64, HTML comment and zero-width detectors are unbounded, so they
+    # need the full MAX_MATCH_SPAN even if every rule is shorter
+    span = max(get_engine().max_span, MAX_MATCH_SPAN)
+    import codecs
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    blocks = MarkdownBlocks() if is_markdown else None
+    groups = None
+
+    buf = ''                # left context + text not yet reported
+    buf_start = 0           # global offset of buf[0]
+    owned = 0               # buf[:owned] is context already reported by a previous window
+    line, column = 1, 1     # position of buf[0]
+    fed = 0                 # buf[:fed] has been fed to the markdown block detector
+
+    with open(filepath, 'rb') if stream is None else nullcontext(stream) as f:
+        eof = False
+        while not eof:
+            raw = f.read(STREAM_READ_SIZE)
+            eof = not raw
+            buf += decoder.decode(raw, final=eof)
+            if not eof and len(buf) < owned + span + STREAM_WINDOW:
+                continue
+
+            if eof:
+                cut = report_end = len(buf)
+            else:
+                # End the window on a line boundary unless a single line is
+                # longer than the whole window
+                cut = buf.rfind('\n', owned + span) + 1 or len(buf)
+                report_end = cut - span
+            window = buf[:cut]
+            open_comment = None if eof else _open_comment(window, owned, report_end)
+            if open_comment is not None and cut - open_comment < STREAM_MAX_COMMENT:
+                continue    # read on until the comment closes, so it is scanned whole
+
+            if blocks is not None:
+                # Feed the complete lines of this window (everything at EOF)
+                feed_end = len(window) if eof else window.rfind('\n', fed) + 1
+                if feed_end > fed:
+                    lines = window[fed:feed_end].split('\n')
+                    if not eof:
+                        lines.pop()     # empty text after the final newline
+                    for text in lines:
+                        blocks.feed_line(text, buf_start + fed)
+                        fed += len(text) + 1
+                if eof:
+                    blocks.finish(buf_start + len(window))
+
+            index = _WindowIndex(window, buf_start, line, column, blocks)
+            found_groups = _scan_groups(window, is_markdown, index, owned, report_end, profile, budget, fail_fast)
+            if open_comment is not None:
+                found_groups[len(RULES) + 1].append(new_finding(
+                    index, open_comment, cut - open_comment, 'CRITICAL',
+                    f'HTML comment still open after {cut - open_comment} characters — contents not fully checked',
+                    window[open_comment:open_comment + 80], 'html-comment'))
+            if groups is None:
+                groups = found_groups
+            else:
+                for group, found in zip(groups, found_groups):
+                    group.extend(found)
+            if fail_fast and _has_critical(found_groups):
+                break
+
+            # Slide forward, keeping `span` characters of left context
+            keep_from = max(report_end - span, 0)
+            consumed = buf[:keep_from]
+            newlines = consumed.count('\n')
+            if newlines:
+                line += newlines
+                column = keep_from - consumed.rfind('\n')
+            else:
+                column += keep_from
+            buf = buf[keep_from:]
+            buf_start += keep_from
+            owned = report_end - keep_from
+            fed = max(fed - keep_from, 0)
+
+    return groups
+
+
+def _oversized_finding(size: int, max_file_size: int) -> Finding:
+    return Finding('CRITICAL', f'File too large to scan ({size} bytes, limit {max_file_size}) — contents not checked',
+                   1, 1, f'[{size} bytes]', 0, 0, 'file-too-large')
+
+
+def _timeout_finding(timeout: ScanTimeout) -> Finding:
+    what = 'scan' if timeout.scope == 'file' else f'rule "{timeout.name}"'
+    return Finding('CRITICAL', f'Scan timeout: {what} exceeded its {timeout.seconds:g}s budget — '
+                               f'file may be crafted to stall the scanner, contents not fully checked',
+                   1, 1, '[scan-timeout]', 0, 0, 'scan-timeout')
+
+
+def _unreadable_finding(reason: str) -> Finding:
+    return Finding('CRITICAL', f'File could not be read ({reason}) — contents not checked',
+                   1, 1, '[unreadable]', 0, 0, 'unreadable')
+
+
+def _scan_guarded(filepath: str, size: int, scan, max_file_size: int, profile: bool,
+                  rule_timeout: float, file_timeout: float, fail_fast: bool) -> dict:
+    """Shared part of scan_file and scan_blob: run `scan(profile, budget)`
+    unless `size` is over `max_file_size`, under a ScanBudget, and build the
+    result dict."""
+    scan_profile = ScanProfile() if profile else None
+    incomplete = False
+    if max_file_size and size > max_file_size:
+        result = collect_findings([[_oversized_finding(size, max_file_size)]])
+    else:
+        try:
+            with ScanBudget(rule_timeout, file_timeout) as budget:
+                result = scan(scan_profile, budget)
+            # Rules and detectors after the first CRITICAL finding were skipped
+            incomplete = fail_fast and result['critical_count'] > 0
+        except ScanTimeout as e:
+            result = collect_findings([[_timeout_finding(e)]])
+            incomplete = True
+
+    result = {'file': filepath, **result}
+    if incomplete:
+        # Timeouts depend on machine load and fail-fast results are partial,
+        # so neither is cached
+        result['incomplete'] = True
+    if scan_profile:
+        result['profile'] = scan_profile.stats
+    return result
+
+
+def scan_file(filepath: str, max_file_size: int = MAX_FILE_SIZE, profile: bool = False,
+              rule_timeout: float = RULE_TIME_BUDGET, file_timeout: float = FILE_TIME_BUDGET,
+              max_findings: int = MAX_FINDINGS_PER_FILE, max_rule_findings: int = MAX_FINDINGS_PER_RULE,
+              fail_fast: bool = False) -> dict:
+    """Scan a single file for security threats.
+
+    Files above STREAM_THRESHOLD are streamed in windows; files above
+    `max_file_size` (0 = no limit) are not read at all and get a CRITICAL
+    finding instead, and so do files where a rule runs longer than
+    `rule_timeout` or the whole scan longer than `file_timeout` seconds. Such
+    timed-out results are marked 'incomplete', as are results with a CRITICAL
+    finding under `fail_fast`, which stops at the first one. Findings are
+    merged and capped by collect_findings. With `profile`, the result carries
+    ScanProfile stats under 'profile'."""
+    size = os.path.getsize(filepath)
+
+    def scan(scan_profile, budget):
+        if size > STREAM_THRESHOLD:
+            groups = _scan_stream(filepath, scan_profile, budget, fail_fast)
+            return collect_findings(groups, len(RULES), max_findings, max_rule_findings)
+        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        return scan_content(content, filepath, scan_profile, budget, max_findings, max_rule_findings, fail_fast)
+
+    return _scan_guarded(filepath, size, scan, max_file_size, profile, rule_timeout, file_timeout, fail_fast)
+
+
+def scan_blob(filepath: str, data: bytes, size: int = None, max_file_size: int = MAX_FILE_SIZE,
+              profile: bool = False, rule_timeout: float = RULE_TIME_BUDGET,
+              file_timeout: float = FILE_TIME_BUDGET, max_findings: int = MAX_FINDINGS_PER_FILE,
+              max_rule_findings: int = MAX_FINDINGS_PER_RULE, fail_fast: bool = False) -> dict:
+    """scan_file for content that is not a file on disk (e.g. a git blob),
+    reported as `filepath`. `data` is either the content, or a binary file
+    object of `size` bytes that is scanned in windows, as scan_file scans
+    files above STREAM_THRESHOLD. It may be None when `size` is over
+    `max_file_size`, since the content is not needed then."""
+    size = len(data) if size is None else size
+
+    def scan(scan_profile, budget):
+        if not isinstance(data, bytes):
+            groups = _scan_stream(filepath, scan_profile, budget, fail_fast, data)
+            return collect_findings(groups, len(RULES), max_findings, max_rule_findings)
+        return scan_content(data.decode('utf-8', errors='ignore'), filepath, scan_profile, budget,
+                            max_findings, max_rule_findings, fail_fast)
+
+    return _scan_guarded(filepath, size, scan, max_file_size, profile, rule_timeout, file_timeout, fail_fast)
+
+
+# ─── Result Cache ─────────────────────────────────────────────────────────────
+# scan_file results are cached on disk keyed by the file's content hash, so an
+# unchanged file costs one read + hash on repeat scans. Entries also record the
+# ruleset fingerprint: any change to RULES or a detector version bump
+# drops every entry made under the old rules.
+
+# Bump a detector's version whenever its logic changes in a way that affects
+# findings; RULES changes are picked up automatically.
+DETECTOR_VERSIONS = {
+    'rules': 3,
+    'code_blocks': 1,
+    'base64': 2,
+    'hidden_text': 1,
+}
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'skill-generator', 'security-scan')
+
+
+def ruleset_fingerprint() -> str:
+    """Hash of every rule and detector version that can influence findings,
+    and of the stored Finding layout."""
+    import hashlib
+
+    payload = json.dumps({'rules': RULES, 'detectors': DETECTOR_VERSIONS, 'finding': Finding._fields},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of scan_file results in a SQLite database."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = CACHE_MAX_BYTES):
+        try:
+            import sqlite3
+        except ImportError as e:    # pragma: no cover - Python built without sqlite
+            raise OSError('sqlite3 module is not available') from e
+        self._db_error = sqlite3.Error
+        cache_dir = cache_dir or default_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fingerprint = ruleset_fingerprint()
+        try:
+            self.db = sqlite3.connect(os.path.join(cache_dir, 'results.sqlite3'), timeout=30)
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                ' key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, result TEXT NOT NULL,'
+                ' size INTEGER NOT NULL, last_used REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+            # Results produced by another ruleset can never be hit again
+            self.db.execute('DELETE FROM results WHERE fingerprint != ?', (self.fingerprint,))
+            self.db.commit()
+        except self._db_error as e:
+            raise OSError(f'cannot open result cache: {e}') from e
+
+    @staticmethod
+    def key_for(filepath: str) -> str:
+        """Cache key for a file: its content hash plus whether it is markdown
+        (markdown files get code block demotion, so results differ)."""
+        import hashlib
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest() + (':md' if filepath.endswith('.md') else '')
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: result} for cached keys and mark them as recently used."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        try:
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = self.db.execute(
+                    f'SELECT key, result FROM results WHERE key IN ({",".join("?" * len(batch))})', batch
+                ).fetchall()
+                found.update((key, json.loads(result)) for key, result in rows)
+            for result in found.values():
+                result['findings'] = [Finding(*f) for f in result['findings']]
+            if found:
+                now = time.time()
+                self.db.executemany('UPDATE results SET last_used = ? WHERE key = ?',
+                                    [(now, key) for key in found])
+                self.db.commit()
+        except self._db_error:
+            pass    # a busy or broken cache only costs a rescan
+        return found
+
+    def put_many(self, items: list):
+        """Store (key, result) pairs, then evict least recently used entries
+        until the cache fits in max_bytes."""
+        now = time.time()
+        rows = []
+        for key, result in items:
+            payload = json.dumps({k: v for k, v in result.items() if k != 'file'})
+            rows.append((key, self.fingerprint, payload, len(payload), now))
+        try:
+            self.db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', rows)
+
+            total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                evicted = []
+                for key, size in self.db.execute('SELECT key, size FROM results ORDER BY last_used'):
+                    evicted.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self.db.executemany('DELETE FROM results WHERE key = ?', evicted)
+            self.db.commit()
+        except self._db_error:
+            self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+def open_cache(cache_dir: str = None):
+    """Open the result cache, or return None (with a warning) if it is unusable."""
+    try:
+        return ResultCache(cache_dir)
+    except OSError as e:
+        print(f"{YELLOW}WARNING:{NC} result cache disabled: {e}", file=sys.stderr)
+        return None
+
+
+# ─── Directory Scanning ───────────────────────────────────────────────────────
+
+SCANNED_EXTENSIONS = ('.md', '.py', '.sh', '.js', '.ts', '.yaml', '.yml', '.json')
+
+# Below this many files a process pool costs more to start than it saves
+PARALLEL_MIN_FILES = 8
+
+
+class TargetError(Exception):
+    """A scan target that is neither a regular file nor a directory."""
+
+
+def check_target(path: str) -> str:
+    """Return `path` if it is a regular file or a directory; raise
+    TargetError otherwise (missing, or e.g. a FIFO or device that a read
+    could block on)."""
+    if not os.path.exists(path):
+        raise TargetError(f'Path not found: {path}')
+    if not (os.path.isfile(path) or os.path.isdir(path)):
+        raise TargetError(f'Not a file or directory: {path}')
+    return path
+
+
+def collect_files(skill_path: str) -> list:
+    """List the files scan_skill would scan, in os.walk order. Raises
+    TargetError."""
+    if os.path.isfile(check_target(skill_path)):
+        return [skill_path]
+    paths = []
+    for root, dirs, files in os.walk(skill_path):
+        for fname in files:
+            if fname.endswith(SCANNED_EXTENSIONS):
+                paths.append(os.path.join(root, fname))
+    return paths
+
+
+def fail_fast_order(paths: list) -> list:
+    """Order `paths` for --fail-fast: SKILL.md files first (shallowest first),
+    since that is where an attack has to live to take effect, then the rest
+    smallest first, so large reference files come last."""
+    def key(path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0    # let scan_file report the problem
+        if os.path.basename(path) == 'SKILL.md':
+            return 0, path.count(os.sep), size
+        return 1, 0, size
+    return sorted(paths, key=key)
+
+
+def _init_worker():
+    # Compile the rule engine once per worker rather than once per file
+    get_engine()
+    # Ctrl-C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _iter_uncached(paths: list, jobs: int = None, **scan_options):
+    scan = partial(scan_file, **scan_options)
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        yield from map(scan, paths)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    get_engine()    # forked workers inherit the compiled engine
+    # Fail-fast callers stop at the first CRITICAL result, so hand out one
+    # file at a time and get the first (SKILL.md) result back soonest
+    chunksize = 1 if scan_options.get('fail_fast') else max(1, len(paths) // (jobs * 4))
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+    try:
+        yield from pool.map(scan, paths, chunksize=chunksize)
+    finally:
+        # If the caller stopped early, drop the files no worker has started
+        pool.shutdown(cancel_futures=True)
+
+
+# New cache entries are written in batches of this many results
+CACHE_WRITE_BATCH = 64
+
+
+def iter_scan_files(paths: list, jobs: int = None, cache: ResultCache = None, **scan_options):
+    """Yield scan_file results for `paths`, in order, each as soon as it and
+    every file before it are done. Scans use up to `jobs` worker processes
+    (default: CPU count); `scan_options` are passed on to scan_file.
+
+    Files whose content is already in `cache` are replayed from it (unless
+    profiling, which has to run every file), so the results are identical to
+    a serial, uncached scan."""
+    if cache is None or scan_options.get('profile'):
+        yield from _iter_uncached(paths, jobs, **scan_options)
+        return
+
+    max_file_size = scan_options.get('max_file_size', MAX_FILE_SIZE)
+    # Finding caps change the stored result, so they are part of the key
+    variant = (f":{scan_options.get('max_findings', MAX_FINDINGS_PER_FILE)}"
+               f"/{scan_options.get('max_rule_findings', MAX_FINDINGS_PER_RULE)}")
+    keys = {}
+    for path in paths:
+        try:
+            # Oversized files are never read, so there is nothing to hash
+            if not max_file_size or os.path.getsize(path) <= max_file_size:
+                keys[path] = cache.key_for(path) + variant
+        except OSError:
+            pass    # let scan_file report the problem
+    cached = cache.get_many(list(keys.values()))
+
+    misses = [path for path in paths if keys.get(path) not in cached]
+    scanned = _iter_uncached(misses, jobs, **scan_options)
+    pending = []
+    try:
+        for path in paths:
+            key = keys.get(path)
+            if key in cached:
+                yield {'file': path, **cached[key]}
+                continue
+            result = next(scanned)
+            if key is not None and not result.get('incomplete'):
+                pending.append((key, result))
+                if len(pending) >= CACHE_WRITE_BATCH:
+                    cache.put_many(pending)
+                    pending = []
+            yield result
+    finally:
+        scanned.close()
+        if pending:
+            cache.put_many(pending)
+
+
+def scan_files(paths: list, jobs: int = None, cache: ResultCache = None, **scan_options) -> list:
+    """List of iter_scan_files results."""
+    return list(iter_scan_files(paths, jobs, cache, **scan_options))
+
+
+def scan_skill(skill_path: str, jobs: int = None, cache: ResultCache = None, **scan_options) -> dict:
+    """Scan an entire skill directory or a single SKILL.md file;
+    `scan_options` are passed on to scan_file.
+
+    With `profile`, the report's 'profile' entry is a ScanProfile merged over
+    all files. Raises TargetError."""
+    results = scan_files(collect_files(skill_path), jobs, cache, **scan_options)
+
+    total_critical = sum(r['critical_count'] for r in results)
+    total_warnings = sum(r['warning_count'] for r in results)
+
+    report = {
+        'path': skill_path,
+        'files_scanned': len(results),
+        'file_results': results,
+        'total_critical': total_critical,
+        'total_warnings': total_warnings,
+    }
+    if scan_options.get('profile'):
+        report['profile'] = ScanProfile()
+        for result in results:
+            report['profile'].merge(result.pop('profile', {}))
+    return report
+
+
+# ─── Git ──────────────────────────────────────────────────────────────────────
+# --git-diff / --staged scan only the files a change touches. Their contents
+# come from git's object store (the index for --staged, the new side of the
+# diff otherwise) through one `git cat-file --batch` process, so the scan
+# sees exactly what is being committed, not the working tree. Blobs are
+# requested by object id, which works for any path, newlines included.
+
+class GitError(Exception):
+    pass
+
+
+def check_revision(rev: str) -> str:
+    """Return `rev` (a revision or an A..B / A...B range) if git cannot
+    mistake it for an option; raise GitError otherwise."""
+    if not rev or any(part.startswith('-') for part in re.split(r'\.{2,3}', rev)):
+        raise GitError(f'invalid revision: {rev!r}')
+    return rev
+
+
+class GitRepo:
+    """The git repository containing `path` (a file or directory)."""
+
+    def __init__(self, path: str = '.'):
+        self.path = path
+        cwd = os.path.abspath(path)
+        cwd = cwd if os.path.isdir(cwd) else os.path.dirname(cwd)
+        self.root = os.fsdecode(self._git('rev-parse', '--show-toplevel', cwd=cwd).strip())
+
+    def _git(self, *args, cwd: str = None) -> bytes:
+        import subprocess
+
+        try:
+            proc = subprocess.run(['git', *args], cwd=cwd or self.root,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise GitError(f'cannot run git: {e}') from e
+        if proc.returncode != 0:
+            message = os.fsdecode(proc.stderr).strip().splitlines()
+            raise GitError(message[-1] if message else f'git {args[0]} failed')
+        return proc.stdout
+
+    def changed_files(self, rev: str = None, staged: bool = False) -> list:
+        """Return (path, blob id) for each scannable file under self.path
+        that is added or modified: in the index vs HEAD if `staged`, else
+        between `rev` and HEAD. `rev` may also be a range, A..B or A...B, in
+        which case the contents come from B. Paths are relative to the
+        current directory unless self.path is absolute, as in collect_files."""
+        if staged:
+            options, revs = ['--cached'], []
+        else:
+            options, revs = [], [check_revision(rev)] if '..' in rev else [check_revision(rev), 'HEAD']
+        out = self._git('diff', '--raw', '-z', '--no-abbrev', '--no-renames', '--diff-filter=d', *options,
+                        '--end-of-options', *revs, '--', os.path.abspath(self.path))
+        # "-z --raw" output: ":<old mode> <new mode> <old id> <new id> <status>\0<path>\0" per file
+        fields = os.fsdecode(out).split('\0')
+        changes = []
+        for meta, name in zip(fields[0::2], fields[1::2]):
+            if name.endswith(SCANNED_EXTENSIONS):
+                path = os.path.join(self.root, name)
+                if not os.path.isabs(self.path):
+                    path = os.path.relpath(path)
+                changes.append((path, meta.split()[3]))
+        return changes
+
+    def read_blobs(self, specs: list, max_size: int = 0, stream_size: int = 0):
+        """Yield (size, data) for each object spec, in order, read through a
+        single `git cat-file --batch` process. Objects over `max_size`
+        (0 = no limit) are skipped over and yield (size, None); missing
+        objects and non-blobs (e.g. submodules) yield (None, None). Blobs
+        over `stream_size` (0 = none) are not loaded: their data is a
+        _PipeSlice reading them from the pipe, valid until the next blob."""
+        import subprocess
+
+        try:
+            proc = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=self.root,
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            raise GitError(f'cannot run git: {e}') from e
+
+        def feed():
+            # From a thread, so a full stdout pipe cannot deadlock the writes
+            try:
+                for spec in specs:
+                    proc.stdin.write(os.fsencode(spec) + b'\n')
+                proc.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass    # the reader stopped early
+
+        threading.Thread(target=feed, daemon=True).start()
+        out = proc.stdout
+        try:
+            for _spec in specs:
+                header = out.readline().split()
+                if len(header) != 3:
+                    if not header:
+                        raise GitError('git cat-file exited unexpectedly')
+                    yield None, None     # "<spec> missing"
+                    continue
+                _oid, kind, size = header
+                size = int(size)
+                if kind != b'blob' or (max_size and size > max_size):
+                    _PipeSlice(out, size + 1).skip()    # content plus its trailing newline
+                    yield (size, None) if kind == b'blob' else (None, None)
+                    continue
+                if stream_size and size > stream_size:
+                    blob = _PipeSlice(out, size)
+                    yield size, blob
+                    blob.skip()     # whatever the scan left unread
+                    out.read(1)
+                    continue
+                data = out.read(size)
+                out.read(1)
+                yield size, data
+        finally:
+            out.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+
+class _PipeSlice:
+    """Binary file object for the next `size` bytes of `pipe`."""
+
+    def __init__(self, pipe, size: int):
+        self.pipe = pipe
+        self.remaining = size
+
+    def read(self, n: int = -1) -> bytes:
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        data = self.pipe.read(n) if n else b''
+        # A short read means the pipe closed early
+        self.remaining = self.remaining - len(data) if len(data) == n else 0
+        return data
+
+    def skip(self):
+        while self.read(1 << 20):
+            pass
+
+
+def iter_scan_git(repo: GitRepo, changes: list, **scan_options):
+    """Yield scan_blob results for GitRepo.changed_files entries, in order.
+
+    Blobs are scanned in this process: a change is usually a handful of
+    files, and the contents are already in memory. Blobs above
+    STREAM_THRESHOLD are streamed from git instead, in windows."""
+    max_file_size = scan_options.get('max_file_size', MAX_FILE_SIZE)
+    blobs = repo.read_blobs([spec for _path, spec in changes], max_file_size, STREAM_THRESHOLD)
+    try:
+        for (path, spec), (size, data) in zip(changes, blobs):
+            if size is None:
+                # A submodule or a missing object: never count it as clean
+                yield {'file': path, **collect_findings([[_unreadable_finding(f'not a blob in git: {spec}')]])}
+            else:
+                yield scan_blob(path, data, size, **scan_options)
+    finally:
+        blobs.close()
+
+
+# ─── Output ──────────────────────────────────────────────────────────────────
+# Reporters render results as they arrive: start() once, file() per scan_file
+# result, then finish(), which returns the exit code. Only the text format
+# uses colors; the others write one self-contained record at a time to
+# stdout and flush, so a pipeline can act on a file as soon as it is reported.
+
+def exit_code_for(total_critical: int, total_warnings: int) -> int:
+    return 1 if total_critical else 2 if total_warnings else 0
+
+
+class Reporter:
+    def __init__(self, path: str, out=None):
+        self.path = path
+        self.out = out or sys.stdout
+        self.files_scanned = 0
+        self.total_critical = 0
+        self.total_warnings = 0
+        self.stopped = False    # set by --fail-fast before finish()
+        self.tracked = None     # set by --watch: path -> (critical, warnings) of every watched file
+
+    def totals(self) -> tuple:
+        """(critical, warnings) the verdict rests on: those of the files in
+        this report or, under --watch, of every watched file."""
+        if self.tracked is None:
+            return self.total_critical, self.total_warnings
+        return (sum(critical for critical, _warnings in self.tracked.values()),
+                sum(warnings for _critical, warnings in self.tracked.values()))
+
+    def start(self, file_count: int):
+        pass
+
+    def file(self, result: dict):
+        self.files_scanned += 1
+        self.total_critical += result['critical_count']
+        self.total_warnings += result['warning_count']
+
+    def finish(self) -> int:
+        return exit_code_for(*self.totals())
+
+    def summary(self) -> dict:
+        total_critical, total_warnings = self.totals()
+        exit_code = exit_code_for(total_critical, total_warnings)
+        return {
+            'path': self.path,
+            'files_scanned': self.files_scanned,
+            **({'files_watched': len(self.tracked)} if self.tracked is not None else {}),
+            'total_critical': total_critical,
+            'total_warnings': total_warnings,
+            'status': ('clean', 'blocked', 'warnings')[exit_code],
+            'exit_code': exit_code,
+            **({'stopped': 'fail-fast'} if self.stopped else {}),
+        }
+
+    def relative(self, filepath: str) -> str:
+        if os.path.isdir(self.path):
+            return os.path.relpath(filepath, self.path)
+        return os.path.basename(filepath)
+
+    def write(self, text: str):
+        self.out.write(text)
+        self.out.flush()
+
+
+class TextReporter(Reporter):
+    """The human-readable, colored report."""
+
+    def start(self, file_count: int):
+        print(f"\n{BOLD}=== Security Scan: {self.path} ==={NC}", file=self.out)
+        print(f"Files to scan: {file_count}\n", file=self.out)
+
+    def file(self, result: dict):
+        super().file(result)
+        if not result['findings']:
+            return
+        print(f"{BOLD}--- {self.relative(result['file'])} ---{NC}", file=self.out)
+        for finding in result['findings']:
+            color = RED if finding.severity == 'CRITICAL' else YELLOW
+            print(f"  {color}{finding.severity}{NC} (line {finding.line}, col {finding.column}): "
+                  f"{finding.description}", file=self.out)
+            print(f"    Match: {finding.match}", file=self.out)
+        if result.get('suppressed'):
+            print(f"  ... {result['suppressed']} more finding(s) not shown "
+                  f"(see --max-findings / --max-findings-per-rule)", file=self.out)
+        print(file=self.out)
+
+    def finish(self) -> int:
+        out = self.out
+        total_critical, total_warnings = self.totals()
+        print(f"{BOLD}=== Summary ==={NC}", file=out)
+        if self.tracked is not None:
+            print(f"  Watched files: {len(self.tracked)} ({self.files_scanned} rescanned)", file=out)
+        else:
+            print(f"  Files scanned: {self.files_scanned}", file=out)
+        print(f"  Critical: {RED}{total_critical}{NC}", file=out)
+        print(f"  Warnings: {YELLOW}{total_warnings}{NC}", file=out)
+        if self.stopped:
+            print(f"  Stopped at the first critical finding (--fail-fast) after "
+                  f"{self.files_scanned} file(s); the rest were not scanned.", file=out)
+
+        if total_critical > 0:
+            print(f"\n{RED}{BOLD}BLOCKED: Skill contains {total_critical} critical security threat(s).{NC}", file=out)
+            print(f"{RED}This skill should NOT be installed. It may contain prompt injection or malicious instructions.{NC}", file=out)
+        elif total_warnings > 0:
+            print(f"\n{YELLOW}{BOLD}REVIEW RECOMMENDED: {total_warnings} warning(s) found.{NC}", file=out)
+            print(f"{YELLOW}Manually review flagged patterns before installing.{NC}", file=out)
+        else:
+            print(f"\n{GREEN}{BOLD}CLEAN: No security threats detected.{NC}", file=out)
+        return super().finish()
+
+
+def _file_record(result: dict) -> dict:
+    record = {
+        'file': result['file'],
+        'critical_count': result['critical_count'],
+        'warning_count': result['warning_count'],
+        'findings': [finding._asdict() for finding in result['findings']],
+    }
+    for key in ('suppressed', 'incomplete'):
+        if result.get(key):
+            record[key] = result[key]
+    return record
+
+
+class NdjsonReporter(Reporter):
+    """One JSON object per line: a 'file' record per file, then a 'summary'."""
+
+    def file(self, result: dict):
+        super().file(result)
+        self.write(json.dumps({'type': 'file', **_file_record(result)}, ensure_ascii=False) + '\n')
+
+    def finish(self) -> int:
+        self.write(json.dumps({'type': 'summary', **self.summary()}) + '\n')
+        return super().finish()
+
+
+class JsonReporter(Reporter):
+    """A single JSON document, {"files": [...], "summary": {...}}, written
+    one file record at a time."""
+
+    def start(self, file_count: int):
+        self.write('{"files": [')
+
+    def file(self, result: dict):
+        separator = ',\n  ' if self.files_scanned else '\n  '
+        super().file(result)
+        self.write(separator + json.dumps(_file_record(result), ensure_ascii=False))
+
+    def finish(self) -> int:
+        self.write(f'\n], "summary": {json.dumps(self.summary())}}}\n')
+        return super().finish()
+
+
+class SarifReporter(Reporter):
+    """SARIF 2.1.0 log with one run; results are written file by file."""
+
+    LEVELS = {'CRITICAL': 'error', 'WARNING': 'warning'}
+
+    def start(self, file_count: int):
+        rules = [(rule_id(idx), rule.severity, rule.description) for idx, rule in enumerate(RULES)]
+        rules += [(rule, severity, description) for rule, (severity, description) in DETECTOR_RULES.items()]
+        driver = {
+            'name': 'security-scan',
+            'rules': [{
+                'id': rule,
+                'shortDescription': {'text': description},
+                'defaultConfiguration': {'level': self.LEVELS[severity]},
+            } for rule, severity, description in rules],
+        }
+        header = {
+            '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+            'version': '2.1.0',
+        }
+        self.results = 0
+        self.write(json.dumps(header)[:-1] + ', "runs": [{"tool": {"driver": ' + json.dumps(driver)
+                   + '}, "results": [')
+
+    def file(self, result: dict):
+        super().file(result)
+        uri = self.relative(result['file']).replace(os.sep, '/')
+        records = []
+        for finding in result['findings']:
+            region = {'startLine': finding.line, 'startColumn': finding.column,
+                      'snippet': {'text': finding.match}}
+            if finding.length:
+                region['charOffset'] = finding.offset
+                region['charLength'] = finding.length
+            records.append(json.dumps({
+                'ruleId': finding.rule,
+                'level': self.LEVELS.get(finding.severity, 'note'),
+                'message': {'text': finding.description},
+                'locations': [{'physicalLocation': {'artifactLocation': {'uri': uri}, 'region': region}}],
+            }, ensure_ascii=False))
+        if records:
+            self.write((',\n' if self.results else '\n') + ',\n'.join(records))
+            self.results += len(records)
+
+    def finish(self) -> int:
+        exit_code = super().finish()
+        invocation = {'executionSuccessful': True, 'exitCode': exit_code,
+                      'properties': self.summary()}
+        self.write(f'\n], "invocations": [{json.dumps(invocation)}]}}]}}\n')
+        return exit_code
+
+
+REPORTERS = {
+    'text': TextReporter,
+    'json': JsonReporter,
+    'ndjson': NdjsonReporter,
+    'sarif': SarifReporter,
+}
+
+
+def print_report(report: dict) -> int:
+    """Print a scan_skill report as text and return its exit code."""
+    reporter = TextReporter(report['path'])
+    reporter.start(report['files_scanned'])
+    for result in report['file_results']:
+        reporter.file(result)
+    return reporter.finish()
+
+
+def report_results(reporter: Reporter, results, file_count: int, fail_fast: bool = False,
+                   profile: ScanProfile = None) -> int:
+    """Report scan results through `reporter` as they arrive and return the
+    exit code. With `fail_fast`, stop at the first file with a CRITICAL
+    finding; with `profile`, merge per-file stats into it. Closes `results`.
+
+    If stdout is closed early (e.g. `| head -1`), the scan still runs to the
+    end with the rest of the report discarded, so the exit code covers every
+    file: an unfinished scan must never pass as clean."""
+
+    def report(method, *args):
+        try:
+            return method(*args)
+        except BrokenPipeError:
+            if reporter.out is not sys.stdout:
+                raise   # e.g. a --serve client that went away
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            reporter.out = open(os.devnull, 'w', encoding='utf-8')
+            # Reporters count a file before writing it, so only a report
+            # that was cut short is written again, to /dev/null
+            return method(*args) if method != reporter.file else None
+
+    try:
+        report(reporter.start, file_count)
+        for result in results:
+            if profile:
+                profile.merge(result.pop('profile', {}))
+            report(reporter.file, result)
+            if fail_fast and result['critical_count']:
+                reporter.stopped = True
+                break
+        return report(reporter.finish)
+    finally:
+        results.close()
+
+
+def run_scan(reporter: Reporter, target: str, git_diff: str = None, staged: bool = False, jobs: int = None,
+             cache: ResultCache = None, profile: ScanProfile = None, **scan_options) -> int:
+    """Scan `target`, or only its changes with `git_diff`/`staged` (see
+    GitRepo.changed_files), report through `reporter` and return the exit
+    code. With fail_fast, files are scanned in fail_fast_order. Other
+    `scan_options` are passed on to scan_file. Raises GitError or TargetError."""
+    fail_fast = scan_options.get('fail_fast', False)
+    scan_options['profile'] = profile is not None
+    if git_diff is not None or staged:
+        repo = GitRepo(target)
+        changes = repo.changed_files(git_diff, staged)
+        if fail_fast:
+            order = {path: i for i, path in enumerate(fail_fast_order([path for path, _spec in changes]))}
+            changes.sort(key=lambda change: order[change[0]])
+        file_count = len(changes)
+        results = iter_scan_git(repo, changes, **scan_options)
+    else:
+        paths = collect_files(target)
+        if fail_fast:
+            paths = fail_fast_order(paths)
+        file_count = len(paths)
+        results = iter_scan_files(paths, jobs, cache, **scan_options)
+    return report_results(reporter, results, file_count, fail_fast, profile)
+
+
+# ─── Watch & Server ───────────────────────────────────────────────────────────
+# Both keep one process, with its compiled rules and open result cache, alive
+# across scans. --watch polls file mtimes and sizes (no OS-specific notifier)
+# and rescans what changed. --serve answers requests on a Unix socket, one at
+# a time: the client sends one JSON object on one line, e.g.
+#   {"target": "/path/to/skill", "format": "ndjson", "fail_fast": true}
+# (also "git_diff", "staged", "max_findings", "max_findings_per_rule"; the
+# format is json, ndjson (default) or sarif) and reads the report until the
+# server closes the connection. Its summary carries the exit code. Errors
+# are reported as {"error": "..."}. A client that stalls for SERVER_TIMEOUT
+# seconds is disconnected. Under --watch, each round's summary covers every
+# watched file, not just the ones it rescanned.
+
+WATCH_INTERVAL = 1.0            # seconds between polls
+SERVER_MAX_REQUEST = 64 * 1024  # bytes per request line
+SERVER_TIMEOUT = 10.0           # seconds a client may stall sending a request or reading a report
+
+
+def _stat_files(paths: list) -> dict:
+    stats = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue    # removed since it was listed
+        stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+def watch(target: str, reporter_class, interval: float = WATCH_INTERVAL, jobs: int = None,
+          cache: ResultCache = None, **scan_options) -> int:
+    """Scan `target`, then poll it every `interval` seconds and rescan the
+    files whose mtime or size changed, reporting each round through a new
+    `reporter_class`, until interrupted. Each round lists the files it
+    rescanned, but its totals, status and exit code cover every watched file.
+    Return the exit code for the latest results of every file. Raises
+    TargetError, also if `target` disappears."""
+    fail_fast = scan_options.get('fail_fast', False)
+    scanned = {}    # path -> (mtime_ns, size) when last scanned
+    counts = {}     # path -> (critical_count, warning_count) of the last scan
+
+    def track(results, stats):
+        try:
+            for result in results:
+                scanned[result['file']] = stats[result['file']]
+                counts[result['file']] = result['critical_count'], result['warning_count']
+                yield result
+        finally:
+            results.close()
+
+    first = True
+    try:
+        while True:
+            current = _stat_files(collect_files(target))
+            changed = [path for path, stats in current.items() if scanned.get(path) != stats]
+            removed = [path for path in scanned if path not in current]
+            for path in removed:
+                del scanned[path]
+                del counts[path]
+            if changed or removed or first:
+                if fail_fast:
+                    changed = fail_fast_order(changed)
+                results = track(iter_scan_files(changed, jobs, cache, **scan_options), current)
+                reporter = reporter_class(target)
+                reporter.tracked = counts
+                report_results(reporter, results, len(changed), fail_fast)
+                total_critical, total_warnings = reporter.totals()
+                print(f"Watching {len(current)} file(s), {len(removed)} removed: {total_critical} critical, "
+                      f"{total_warnings} warning(s) in total. Ctrl-C to stop.", file=sys.stderr)
+                first = False
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return exit_code_for(sum(critical for critical, _warnings in counts.values()),
+                         sum(warnings for _critical, warnings in counts.values()))
+
+
+def _serve_request(conn, jobs: int, cache: ResultCache, scan_options: dict):
+    # Requests are served one at a time, so an idle client must not hold the server
+    conn.settimeout(SERVER_TIMEOUT)
+    out = conn.makefile('w', encoding='utf-8')
+    try:
+        try:
+            request = json.loads(conn.makefile('rb').readline(SERVER_MAX_REQUEST))
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            target = request.get('target')
+            if not isinstance(target, str):
+                raise ValueError('"target" must be a path')
+            check_target(target)
+            fmt = request.get('format', 'ndjson')
+            if fmt == 'text' or fmt not in REPORTERS:
+                raise ValueError('"format" must be json, ndjson or sarif')
+            for key in ('fail_fast', 'staged'):
+                if not isinstance(request.get(key, False), bool):
+                    raise ValueError(f'"{key}" must be true or false')
+            options = dict(scan_options, fail_fast=request.get('fail_fast', False))
+            for key, option in (('max_findings', 'max_findings'), ('max_findings_per_rule', 'max_rule_findings')):
+                if key in request:
+                    # bool is an int subclass, but true is not a limit
+                    if type(request[key]) is not int or request[key] < 0:
+                        raise ValueError(f'"{key}" must be a non-negative integer')
+                    options[option] = request[key]
+            git_diff = request.get('git_diff')
+            staged = request.get('staged', False)
+            if git_diff is not None and (staged or not isinstance(git_diff, str)):
+                raise ValueError('"git_diff" must be a revision, and cannot be combined with "staged"')
+            if git_diff is not None:
+                check_revision(git_diff)
+            run_scan(REPORTERS[fmt](target, out), target, git_diff, staged, jobs, cache, **options)
+        except (ValueError, GitError, TargetError) as e:
+            out.write(json.dumps({'error': str(e)}) + '\n')
+        out.flush()
+    except OSError:
+        pass    # the client went away
+    finally:
+        try:
+            out.close()
+        except OSError:
+            pass
+
+
+def serve(address: str, jobs: int = None, cache: ResultCache = None, **scan_options):
+    """Answer scan requests on the Unix socket at `address` until interrupted
+    (see the protocol above), reusing the compiled rules and `cache`. The
+    socket is only accessible to the current user."""
+    import socket
+
+    get_engine()
+    if os.path.exists(address):
+        if not stat.S_ISSOCK(os.stat(address).st_mode):
+            raise OSError(f'{address} exists and is not a socket')
+        os.unlink(address)      # left over from a previous server
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(address)
+    finally:
+        os.umask(umask)
+    server.listen()
+    print(f"Serving scan requests on {address}. Ctrl-C to stop.", file=sys.stderr)
+    try:
+        while True:
+            conn, _addr = server.accept()
+            with conn:
+                _serve_request(conn, jobs, cache, scan_options)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(address)
+        except OSError:
+            pass
+
+
+# ─── Main ─────────────────────────────────────────────────────────────────────
+
+def parse_revision(value: str) -> str:
+    try:
+        return check_revision(value)
+    except GitError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as 4096, 500K, 64M or 1G."""
+    match = re.fullmatch(r'\s*(\d+)\s*([KMG]?)B?\s*', value, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f'invalid size: {value!r}')
+    number, unit = match.groups()
+    return int(number) * 1024 ** ' KMG'.index(unit.upper() or ' ')
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser that reports usage errors with exit code 3."""
+
+    def error(self, message):
+        self.print_usage(sys.stderr)
+        print(f"{RED}ERROR:{NC} {message}", file=sys.stderr)
+        sys.exit(3)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = _ArgumentParser(
+        prog='security-scan.py',
+        description='Scans Agent Skills for prompt injection and security threats.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            "Examples:\n"
+            "  python security-scan.py ./my-skill/\n"
+            "  python security-scan.py ./my-skill/SKILL.md\n"
+            "  python security-scan.py --jobs 4 ~/.cursor/skills/\n"
+            "  python security-scan.py --format ndjson ~/.cursor/skills/ | jq .\n"
+            "  python security-scan.py --fail-fast ./downloaded-skill/\n"
+            "  python security-scan.py --staged              # pre-commit hook\n"
+            "  python security-scan.py --git-diff origin/main .cursor/skills/\n"
+            "  python security-scan.py --watch ./my-skill/\n"
+            "  python security-scan.py --serve /tmp/security-scan.sock\n"
+            "  python security-scan.py --audit-rules\n"
+            "\nExit codes:\n"
+            "  0 - Clean\n"
+            "  1 - BLOCKED (critical threats)\n"
+            "  2 - Warnings (review recommended)\n"
+            "  3 - Usage error"
+        ),
+    )
+    parser.add_argument('target', nargs='?',
+                        help='skill directory or SKILL.md file to scan (with --git-diff/--staged: '
+                             'limits the scan to this path, default: the current directory)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--git-diff', type=parse_revision, metavar='REV',
+                     help='scan only files added or modified between REV and HEAD (or in a range '
+                          'A..B / A...B), as committed')
+    mode.add_argument('--staged', action='store_true',
+                     help='scan only staged files, as they are in the index')
+    mode.add_argument('--watch', nargs='?', type=float, const=WATCH_INTERVAL, metavar='SECONDS',
+                     help='after the first scan, poll the target every SECONDS '
+                          f'(default: {WATCH_INTERVAL:g}) and rescan files whose mtime or size changed')
+    mode.add_argument('--serve', metavar='SOCKET',
+                     help='answer JSON scan requests on a Unix socket instead of scanning a target, '
+                          'keeping the rules compiled between requests')
+    parser.add_argument('-f', '--format', choices=sorted(REPORTERS), default='text',
+                        help='output format: colored text (default), or json, ndjson or sarif '
+                             'written to stdout one file at a time as results arrive')
+    parser.add_argument('-j', '--jobs', type=int, default=None, metavar='N',
+                        help='scan files with N worker processes (default: CPU count)')
+    parser.add_argument('--max-file-size', type=parse_size, default=MAX_FILE_SIZE, metavar='SIZE',
+                        help='report files larger than SIZE (e.g. 500K, 64M, 1G; 0 = no limit) '
+                             'as CRITICAL instead of scanning them (default: 64M)')
+    parser.add_argument('--rule-timeout', type=float, default=RULE_TIME_BUDGET, metavar='SECONDS',
+                        help='report a file as CRITICAL when one rule runs longer than this on it '
+                             f'(0 = no limit; default: {RULE_TIME_BUDGET:g})')
+    parser.add_argument('--file-timeout', type=float, default=FILE_TIME_BUDGET, metavar='SECONDS',
+                        help='report a file as CRITICAL when scanning it takes longer than this '
+                             f'(0 = no limit; default: {FILE_TIME_BUDGET:g})')
+    parser.add_argument('--max-findings', type=int, default=MAX_FINDINGS_PER_FILE, metavar='N',
+                        help='list at most N findings per file; the rest are only counted '
+                             f'(0 = no limit; default: {MAX_FINDINGS_PER_FILE})')
+    parser.add_argument('--max-findings-per-rule', type=int, default=MAX_FINDINGS_PER_RULE, metavar='N',
+                        help='list at most N findings per rule and file '
+                             f'(0 = no limit; default: {MAX_FINDINGS_PER_RULE})')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='stop at the first CRITICAL finding and exit 1; SKILL.md and cheap, '
+                             'decisive rules are checked first (clean skills still get a full scan)')
+    parser.add_argument('--audit-rules', action='store_true',
+                        help='check the rules themselves for catastrophic backtracking and exit '
+                             '(1 = exponential, 2 = polynomial, 0 = clean)')
+    parser.add_argument('--profile', action='store_true',
+                        help='print time, matches and throughput per rule and detector to stderr '
+                             '(implies --no-cache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='rescan every file instead of replaying cached results, and analyse the '
+                             'rules afresh instead of loading or saving their index')
+    parser.add_argument('--cache-dir', metavar='DIR', default=None,
+                        help=f'location of the result cache and the saved rule index '
+                             f'(default: {default_cache_dir()})')
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    if len(sys.argv) < 2:
+        parser.print_help()
+        sys.exit(3)
+
+    args = parser.parse_args()
+    global ENGINE_CACHE_DIR
+    ENGINE_CACHE_DIR = '' if args.no_cache else args.cache_dir
+    if args.audit_rules:
+        sys.exit(print_audit(audit_rules()))
+    git_mode = args.git_diff is not None or args.staged
+    if args.target is None and not (git_mode or args.serve):
+        parser.error('the following arguments are required: target')
+    if args.serve and args.target is not None:
+        parser.error('--serve takes targets from its requests, not the command line')
+    if args.serve:
+        import socket
+
+        if not hasattr(socket, 'AF_UNIX'):
+            parser.error('--serve needs Unix domain sockets, which this platform lacks')
+    if args.watch is not None and args.watch <= 0:
+        parser.error('--watch interval must be positive')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.rule_timeout < 0 or args.file_timeout < 0:
+        parser.error('timeouts must not be negative')
+    if args.max_findings < 0 or args.max_findings_per_rule < 0:
+        parser.error('finding limits must not be negative')
+
+    scan_options = dict(max_file_size=args.max_file_size, rule_timeout=args.rule_timeout,
+                        file_timeout=args.file_timeout, max_findings=args.max_findings,
+                        max_rule_findings=args.max_findings_per_rule, fail_fast=args.fail_fast)
+    target = args.target or '.'
+    if git_mode:
+        try:
+            check_target(target)
+        except TargetError as e:
+            print(f"{RED}ERROR:{NC} {e}", file=sys.stderr)
+            sys.exit(3)
+    # Git mode scans blobs, not files, so there is nothing to cache
+    use_cache = not (args.no_cache or args.profile or git_mode)
+    cache = open_cache(args.cache_dir) if use_cache else None
+    try:
+        if args.serve:
+            try:
+                serve(args.serve, args.jobs, cache, **scan_options)
+            except OSError as e:
+                print(f"{RED}ERROR:{NC} {e}", file=sys.stderr)
+                sys.exit(3)
+            sys.exit(0)
+        profile = ScanProfile() if args.profile and args.watch is None else None
+        try:
+            if args.watch is not None:
+                exit_code = watch(target, REPORTERS[args.format], args.watch, args.jobs, cache, **scan_options)
+            else:
+                exit_code = run_scan(REPORTERS[args.format](target), target, args.git_diff, args.staged,
+                                     args.jobs, cache, profile, **scan_options)
+        except (GitError, TargetError) as e:
+            print(f"{RED}ERROR:{NC} {e}", file=sys.stderr)
+            exit_code = 3
+    finally:
+        if cache is not None:
+            cache.close()
+    if profile:
+        profile.print_report()
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()